@@ -0,0 +1,72 @@
+"""Micro-benchmark of TitleScorer against difflib, run with [queries] [titles]."""
+
+from __future__ import annotations
+
+import random
+import string
+import sys
+import time
+from difflib import SequenceMatcher
+
+from pptu.utils.fuzzy import MATCH_THRESHOLD, TitleScorer
+
+
+def difflib_ratio(candidate: str, query: str) -> float:
+    return SequenceMatcher(None, candidate.casefold(), query.casefold()).ratio()
+
+
+def main() -> None:
+    num_queries = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    num_titles = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+
+    rng = random.Random(1)
+    words = [
+        "".join(rng.choices(string.ascii_lowercase, k=rng.randint(2, 9)))
+        for _ in range(3000)
+    ]
+    titles = [
+        " ".join(rng.choices(words, k=rng.randint(1, 6))).title()
+        for _ in range(num_titles)
+    ]
+    # Half of the queries have an exact match, like a search for a known title
+    queries = rng.sample(titles, num_queries // 2) + [
+        " ".join(rng.choices(words, k=3)) for _ in range(num_queries - num_queries // 2)
+    ]
+    pairs = num_queries * num_titles
+
+    start = time.perf_counter()
+    expected = [[difflib_ratio(x, q) >= MATCH_THRESHOLD for x in titles] for q in queries]
+    difflib_threshold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = []
+    for query in queries:
+        scorer = TitleScorer(query)
+        actual.append([scorer.matches(x) for x in titles])
+    scorer_threshold = time.perf_counter() - start
+    assert actual == expected, "threshold results differ from difflib"
+
+    start = time.perf_counter()
+    expected_best = [max(difflib_ratio(x, q) for x in titles) for q in queries]
+    difflib_best = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual_best = [TitleScorer(q).best(titles) for q in queries]
+    scorer_best = time.perf_counter() - start
+    assert [x[1] if x else 0.0 for x in actual_best] == expected_best, (
+        "best scores differ from difflib"
+    )
+
+    print(f"{num_queries} queries x {num_titles} titles, per pair:")
+    print(
+        f"  threshold check: difflib {difflib_threshold / pairs * 1e6:.1f} us,"
+        f" TitleScorer {scorer_threshold / pairs * 1e6:.1f} us"
+    )
+    print(
+        f"  best match:      difflib {difflib_best / pairs * 1e6:.1f} us,"
+        f" TitleScorer {scorer_best / pairs * 1e6:.1f} us"
+    )
+
+
+if __name__ == "__main__":
+    main()
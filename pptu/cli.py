@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import contextlib
+import multiprocessing
 import sys
 import time
 from pathlib import Path
@@ -15,10 +16,12 @@ from rich.prompt import Confirm
 from rich.table import Table
 
 from pptu import PROG_NAME, __version__, uploaders
-from pptu.pptu import PPTU
+from pptu.pptu import PPTU, hash_torrents
 from pptu.uploaders import Uploader
+from pptu.utils.cache import METADATA_CACHE, METADATA_NEGATIVE_CACHE
 from pptu.utils.click import AliasedGroup, CaseInsensitiveSection
 from pptu.utils.config import Config
+from pptu.utils.content import ContentIndex
 from pptu.utils.log import eprint, print, wprint
 
 CONTEXT_SETTINGS = Context.settings(
@@ -96,6 +99,11 @@ CONTEXT_SETTINGS = Context.settings(
     is_flag=True,
     help="Create torrents but don't upload.",
 )
+@cloup.option(
+    "--dry-run",
+    is_flag=True,
+    help="Print the snapshot plan without creating or uploading anything.",
+)
 @cloup.option(
     "-n",
     "--note",
@@ -143,6 +151,10 @@ def main(ctx: cloup.Context, /, **kwargs: Any) -> None:
 
     dirs = PlatformDirs(appname=PROG_NAME, appauthor=False)
     config = Config(dirs.user_config_path / "config.toml")
+    METADATA_CACHE.ttl = config.get("default", "metadata_cache_ttl", 7 * 24) * 60 * 60
+    METADATA_NEGATIVE_CACHE.ttl = (
+        config.get("default", "metadata_negative_cache_ttl", 6) * 60 * 60
+    )
 
     if args.list_trackers:
         supported_trackers = Table(
@@ -190,6 +202,10 @@ def result(ctx: cloup.Context, /, trackers: list[Uploader], **kwargs: Any) -> No
         and args.fast_upload is not False
     )
 
+    if not args.dry_run:
+        for tracker in trackers:
+            tracker.prefetch([x for x in args.input if x.exists()])
+
     for path in args.input:
         if not path.exists():
             eprint(f"File [cyan]{path.name!r}[/] does not exist.")
@@ -198,15 +214,29 @@ def result(ctx: cloup.Context, /, trackers: list[Uploader], **kwargs: Any) -> No
         cache_dir = ctx.obj.dirs.user_cache_path / f"{path.name}_files"
         cache_dir.mkdir(parents=True, exist_ok=True)
 
-        for tracker in trackers:
-            pptu = PPTU(
+        index = ContentIndex(path)
+
+        pptus = [
+            PPTU(
                 path,
                 tracker,
                 note=args.note,
                 auto=args.auto,
                 snapshots=not args.disable_snapshots,
                 dirs=ctx.obj.dirs,
+                index=index,
             )
+            for tracker in trackers
+        ]
+        if args.dry_run:
+            for pptu in pptus:
+                pptu.print_snapshot_plan()
+            continue
+
+        hash_torrents(pptus)
+
+        for pptu in pptus:
+            tracker = pptu.tracker
 
             print(
                 f"\n[bold green]Creating torrent file for tracker ({tracker.cli.aliases[0]})[/]"
@@ -264,4 +294,6 @@ main.add_section(section)
 
 
 if __name__ == "__main__":
+    # Needed for the hashing process pool in standalone builds
+    multiprocessing.freeze_support()
     main()
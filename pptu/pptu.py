@@ -1,17 +1,19 @@
 from __future__ import annotations
 
+import contextlib
 import glob
 import math
+import os
 import random
 import re
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from hashlib import sha1
 from pathlib import Path
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any
 
-import oxipng
-import torf
+import orjson
 from platformdirs import PlatformDirs
-from pymediainfo import MediaInfo
 from pyrosimple.util.metafile import Metafile
 from rich.progress import (
     BarColumn,
@@ -21,17 +23,28 @@ from rich.progress import (
     TextColumn,
     TimeRemainingColumn,
 )
+from rich.status import Status
 from torf import Torrent
-from wand.image import Image
 
-from pptu.utils.collections import as_list, flatten
+from pptu.utils.collections import as_list, first_or_none, flatten
 from pptu.utils.config import Config
+from pptu.utils.content import VIDEO_SUFFIXES, ContentIndex
+from pptu.utils.hashing import PieceStore, hash_pieces
 from pptu.utils.io import which
 from pptu.utils.log import eprint, print, wprint
+from pptu.utils.mediainfo import mediainfo_text, mediainfo_texts, parse_mediainfo
 from pptu.utils.progress import CustomTransferSpeedColumn
+from pptu.utils.snapshots import (
+    SNAPSHOT_FILTER,
+    SNAPSHOT_PIX_FMT,
+    extract_snapshots,
+    pick_candidate,
+    probe_frames,
+)
 
 if TYPE_CHECKING:
     from pptu.uploaders import Uploader
+    from pptu.utils.snapshots import FrameStats
 
 
 class PPTU:
@@ -44,9 +57,11 @@ class PPTU:
         auto: bool = False,
         snapshots: bool = False,
         dirs: PlatformDirs,
+        index: ContentIndex | None = None,
     ):
         self.path: Path = path
         self.tracker: Uploader = tracker
+        self.index: ContentIndex = index or ContentIndex(path)
         self.note: str | None = note
         self.auto: bool = auto
 
@@ -54,11 +69,16 @@ class PPTU:
 
         self.cache_dir: Path = dirs.user_cache_path / f"{path.name}_files"
         self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.snapshot_dir: Path = dirs.user_cache_path / "snapshots"
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
         self.config = Config(dirs.user_config_path / "config.toml")
 
         self.torrent_path: Path = (
             self.cache_dir / f"{self.path.name}[{self.tracker.cli.aliases[0]}].torrent"
         )
+        self.piece_store = PieceStore(self.torrent_path.with_suffix(".pieces"))
+        self.manifest: list[list[Any]] = []
+        self.torrent: Torrent | None = None
         if snapshots and self.config.get(tracker, "snapshots", True):
             self.num_snapshots = max(
                 (
@@ -91,7 +111,7 @@ class PPTU:
             None,
         )
 
-        if self.torrent_path.exists():
+        if torrent_creator == "torrenttools" and self.torrent_path.exists():
             try:
                 time = self.path.stat().st_mtime
                 if self.path.is_dir():
@@ -113,45 +133,20 @@ class PPTU:
         else:
             randomize_infohash = not self.tracker.source
 
-        if torrent_creator == "torf":
-            piece_size = 2**18
+        if torrent_creator in ("torf", "pptu"):
+            torrent = self.plan_torrent()
 
-            if self.path.is_file():
-                total_bytes = self.path.stat().st_size
-            else:
-                total_bytes = sum(
-                    f.stat().st_size for f in self.path.rglob("*") if f.is_file()
-                )
-
-            target_pieces = 1500
-            exponent = max(18, min(24, round(math.log2(total_bytes / target_pieces))))
-            piece_size = 2**exponent
-
-            torrent = Torrent(
-                self.path,
-                trackers=announce_url,
-                private=True if self.tracker.private else None,
-                source=self.tracker.source,
-                created_by=None,
-                creation_date=None,
-                piece_size=piece_size,
-                randomize_infohash=randomize_infohash,
-                exclude_regexs=[self.tracker.exclude_regex],
-            )
+            if self.torrent_path.exists():
+                if (
+                    self.piece_store.files == self.manifest
+                    and Torrent.read(self.torrent_path).metainfo["info"]["pieces"]
+                    == self.piece_store.pieces
+                ):
+                    return True
+                wprint("Source was possible updated, creating new torrent file.")
+                self.torrent_path.unlink()
 
-            if base_torrent_path:
-                torrent.reuse(base_torrent_path)
-                try:
-                    torrent.validate()
-                except torf.MetainfoError:
-                    wprint("Torrent file is invalid, recreating")
-                else:
-                    torrent.trackers = announce_url
-                    torrent.randomize_infohash = randomize_infohash
-                    torrent.source = self.tracker.source
-                    torrent.private = True if self.tracker.private else None
-                    torrent.write(self.torrent_path)
-            else:
+            if self.piece_store.dirty_ranges(self.manifest, torrent.piece_size):
                 print()
                 with Progress(
                     BarColumn(),
@@ -159,29 +154,13 @@ class PPTU:
                     TaskProgressColumn(),
                     TimeRemainingColumn(elapsed_when_finished=True),
                 ) as progress:
-                    files = []
-
-                    def update_progress(
-                        torrent: Torrent,
-                        filepath: str,
-                        pieces_done: int,
-                        pieces_total: int,
-                    ) -> None:
-                        if filepath not in files:
-                            progress.console.print(
-                                f"[bold white]Hashing [not bold white]{Path(filepath).name}..."
-                            )
-                            files.append(filepath)
-
-                        progress.update(
-                            task,
-                            completed=pieces_done * torrent.piece_size,
-                            total=pieces_total * torrent.piece_size,
-                        )
-
-                    task = progress.add_task(description="")
-                    torrent.generate(callback=update_progress)
-                    torrent.write(self.torrent_path)
+                    self.hash_torrent(torrent, progress)
+            else:
+                torrent.metainfo["info"]["pieces"] = self.piece_store.pieces
+
+            torrent.trackers = announce_url
+            torrent.randomize_infohash = randomize_infohash
+            torrent.write(self.torrent_path)
 
             return True
         elif torrent_creator == "torrenttools":
@@ -232,44 +211,146 @@ class PPTU:
         else:
             eprint(f"Invalid torrent creator: {torrent_creator}", fatal=True)
 
-    def get_mediainfo(self) -> str | list[str]:
-        mediainfo_path: Path = self.cache_dir / "mediainfo.txt"
-        if self.tracker.all_files and self.path.is_dir():
-            mediainfo_path = self.cache_dir / "mediainfo_all.txt"
+    def plan_torrent(self) -> Torrent:
+        """Build the metadata of the torrent without hashing anything."""
+        # Planned once per run, torf walks the whole input to build it
+        if self.torrent is not None:
+            return self.torrent
+
+        torrent = Torrent(
+            self.path,
+            private=True if self.tracker.private else None,
+            source=self.tracker.source,
+            created_by=None,
+            creation_date=None,
+            exclude_regexs=[self.tracker.exclude_regex],
+        )
+        self.manifest = self.index.manifest(torrent.filepaths)
+
+        # Adopt the pieces of another tracker's torrent with the same files
+        if self.piece_store.files != self.manifest:
+            for store_path in self.cache_dir.glob(
+                glob.escape(f"{self.path.name}[") + "*" + glob.escape("].pieces")
+            ):
+                piece_store = PieceStore(store_path)
+                if piece_store.pieces and piece_store.files == self.manifest:
+                    self.piece_store.save(
+                        self.manifest, piece_store.piece_size, piece_store.pieces
+                    )
+                    break
+
+        total_bytes = self.index.total_size(self.tracker.exclude_regex)
+
+        target_pieces = 1500
+        exponent = max(18, min(24, round(math.log2(total_bytes / target_pieces))))
+        torrent.piece_size = 2**exponent
+        # Keep the piece size of the stored pieces if it's still reasonable,
+        # so adding or replacing a file doesn't invalidate all of them
+        if self.piece_store.pieces and (
+            target_pieces / 2
+            <= total_bytes / self.piece_store.piece_size
+            <= target_pieces * 2
+        ):
+            torrent.piece_size = self.piece_store.piece_size
 
-        mediainfo = ""
+        self.torrent = torrent
+        return torrent
 
-        if mediainfo_path.exists():
-            mediainfo: str = mediainfo_path.read_text().strip()
+    def hash_torrent(
+        self,
+        torrent: Torrent,
+        progress: Progress,
+        *,
+        workers: int | None = None,
+        description: str = "",
+    ) -> bytes:
+        """Hash the pieces missing from the piece store and add them to `torrent`."""
+        torrent_creator: str = self.config.get("default", "torrent_creator", "torf")
+        workers = workers or self.config.get("default", "hash_workers")
+
+        ranges = self.piece_store.dirty_ranges(self.manifest, torrent.piece_size)
+        if reused := torrent.pieces - sum(last - first for first, last in ranges):
+            progress.console.print(f"Reusing {reused}/{torrent.pieces} cached pieces")
+
+        files = []
+
+        def update_progress(
+            torrent: Torrent,
+            filepath: str,
+            pieces_done: int,
+            pieces_total: int,
+        ) -> None:
+            if filepath not in files:
+                progress.console.print(
+                    f"[bold white]Hashing [not bold white]{Path(filepath).name}..."
+                )
+                files.append(filepath)
 
-        if not mediainfo:
-            if self.path.is_file() or self.tracker.all_files:
-                f: Path = self.path
-            else:
-                f = sorted(
-                    [
-                        *self.path.glob("*.mkv"),
-                        *self.path.glob("*.mp4"),
-                        *self.path.glob("*.m2ts"),
-                    ]
-                )[0]
+            progress.update(
+                task,
+                completed=pieces_done * torrent.piece_size,
+                total=pieces_total * torrent.piece_size,
+            )
 
-            mediainfo = MediaInfo.parse(f, output="", full=False)
-            mediainfo = mediainfo.replace(str(f), f.name)
-            mediainfo_path.write_text(mediainfo)
+        task = progress.add_task(description=description)
+        if torrent_creator == "torf" and not reused:
+            torrent.generate(threads=workers, callback=update_progress)
+            self.piece_store.save(
+                self.manifest, torrent.piece_size, torrent.metainfo["info"]["pieces"]
+            )
+        else:
+            hashes = hash_pieces(
+                torrent.filepaths,
+                torrent.piece_size,
+                ranges=ranges,
+                workers=workers,
+                callback=lambda *args: update_progress(torrent, *args),
+            )
+            torrent.metainfo["info"]["pieces"] = self.piece_store.update(
+                self.manifest, torrent.piece_size, ranges, hashes
+            )
+
+        return self.piece_store.pieces
+
+    def get_mediainfo(self) -> str | list[str]:
+        # Parses are cached per file identity, so a replaced file is parsed again
+        if self.tracker.all_files and self.path.is_dir():
+            mediainfo = self.get_mediainfo_all()
+        else:
+            f: Path = self.path
+            if self.path.is_dir():
+                f = self.index.videos(VIDEO_SUFFIXES)[0]
+            mediainfo = mediainfo_text(f).replace(str(f), f.name)
 
         mediainfo_list = [x.strip() for x in re.split(r"\n\n(?=General)", mediainfo)]
         if not self.tracker.all_files:
             return mediainfo_list[0]
         return mediainfo_list
 
-    def generate_snapshots(self) -> list[Path]:
-        if self.path.is_dir():
-            files = sorted([*self.path.glob("*.mkv"), *self.path.glob("*.mp4")])
-        elif self.path.is_file():
-            files = [self.path]
+    def get_mediainfo_all(self) -> str:
+        files = self.index.videos()
+        with Progress(
+            TextColumn("[progress.description]{task.description}[/]"),
+            BarColumn(),
+            MofNCompleteColumn(),
+            TimeRemainingColumn(elapsed_when_finished=True),
+            transient=True,
+        ) as progress:
+            task = progress.add_task(
+                f"[bold green]Generating MediaInfo ({self.tracker.cli.aliases[0]})[/]",
+                total=len(files),
+            )
+            texts = mediainfo_texts(files, callback=lambda _: progress.advance(task))
 
-        num_snapshots = self.num_snapshots + 1
+        return "\n\n".join(
+            x.strip().replace(str(self.path), self.path.name) for x in texts
+        )
+
+    def plan_snapshots(self) -> list[tuple[Path, list[float]]] | None:
+        """Plan the file and candidate timestamps of every snapshot, None if unusable."""
+        files = self.index.videos() if self.path.is_dir() else [self.path]
+
+        num_snapshots = self.num_snapshots
         if self.tracker.all_files and self.path.is_dir():
             num_snapshots = len(files)
 
@@ -279,87 +360,218 @@ class PPTU:
             files = flatten(zip(*([orig_files] * i), strict=True))
             i += 1
 
-        snapshots = []
+        suffix = ("_all" if self.tracker.all_files else "") + (
+            "_rand" if self.tracker.random_snapshots else ""
+        )
+        # Kept with the seed of random snapshots, so an interrupted run resumes with
+        # the same timestamps. Trackers of the same run may want different plans.
+        plan_path = self.cache_dir / f"snapshots_{num_snapshots}{suffix}.json"
+        key = {
+            "files": [
+                [str(x), x.stat().st_size, x.stat().st_mtime_ns] for x in orig_files
+            ],
+            "num_snapshots": num_snapshots,
+        }
+        with contextlib.suppress(FileNotFoundError, orjson.JSONDecodeError):
+            plan = orjson.loads(plan_path.read_bytes())
+            if plan.get("key") == key:
+                return [
+                    (Path(file), candidates) for file, candidates in plan["snapshots"]
+                ]
+
+        durations: dict[Path, float] = {}
+        for file in dict.fromkeys(files[:num_snapshots]):
+            mediainfo_obj = parse_mediainfo(file)
+            if not mediainfo_obj.video_tracks:
+                eprint("File has no video tracks")
+                return None
+            if not mediainfo_obj.audio_tracks:
+                eprint("File has no audio tracks")
+                return None
+            raw_duration = mediainfo_obj.video_tracks[0].duration
+            if not raw_duration:
+                eprint("Could not determine video duration")
+                return None
+            durations[file] = float(raw_duration) / 1000
+
+        seed = random.randrange(2**32)
+        rng = random.Random(seed)
+        slots: list[tuple[Path, list[float]]] = []
+        last_file = None
+        for i in range(num_snapshots):
+            interval = durations[files[i]] / (num_snapshots + 2)
+
+            j = i
+            if last_file != files[i]:
+                j = 0
+            last_file = files[i]
+
+            timestamp = (
+                rng.randint(
+                    round(interval * 10),
+                    round(interval * 10 * num_snapshots),
+                )
+                / 10
+                if self.tracker.random_snapshots
+                else interval * (j + 1)
+            )
+            # The first candidate is preferred, the others stand in for a bad frame.
+            # They're a third of an interval away, so they never meet the
+            # stand-ins of the neighbouring snapshots.
+            candidates = [timestamp, timestamp + interval / 3, timestamp - interval / 3]
+            slots.append(
+                (
+                    files[i],
+                    [round(x, 3) for x in candidates if 0 < x < durations[files[i]]],
+                )
+            )
+
+        plan_path.write_bytes(
+            orjson.dumps(
+                {
+                    "key": key,
+                    "seed": seed,
+                    "snapshots": [[str(file), candidates] for file, candidates in slots],
+                },
+                option=orjson.OPT_INDENT_2,
+            )
+        )
+        return slots
+
+    def snapshot_path(self, file: Path, timestamp: float) -> Path:
+        """Path of the snapshot of `file` at `timestamp`, shared by all trackers."""
+        stat = file.stat()
+        key = ":".join(
+            map(
+                str,
+                (
+                    stat.st_dev,
+                    stat.st_ino,
+                    stat.st_size,
+                    stat.st_mtime_ns,
+                    timestamp,
+                    SNAPSHOT_FILTER,
+                    SNAPSHOT_PIX_FMT,
+                ),
+            )
+        )
+        return self.snapshot_dir / f"{sha1(key.encode()).hexdigest()}.png"
+
+    def print_snapshot_plan(self) -> None:
+        print(f"\n[bold green]Snapshot plan ({self.tracker.cli.aliases[0]})[/]")
+        for i, (file, candidates) in enumerate(self.plan_snapshots() or [], 1):
+            print(
+                f"{i:02}: [cyan]{file.name}[/] at {candidates[0]:.1f}s"
+                f" ({len(candidates) - 1} stand-ins)"
+            )
+
+    def generate_snapshots(self) -> list[Path]:
+        if not (slots := self.plan_snapshots()):
+            return []
+
+        cpu_count = os.cpu_count() or 1
+        workers = self.config.get("default", "snapshot_workers") or cpu_count
+
+        def probe(
+            requests: dict[Path, list[tuple[int, list[float]]]],
+        ) -> dict[int, list[FrameStats | None]]:
+            # Probe the timestamps of every (slot, timestamps) request, one
+            # ffmpeg process per file
+            results: dict[int, list[FrameStats | None]] = {}
+            if not requests:
+                return results
+            probe_workers = max(1, min(workers, len(requests)))
+            with ThreadPoolExecutor(max_workers=probe_workers) as executor:
+                probes = {
+                    executor.submit(
+                        probe_frames,
+                        file,
+                        [x for _, timestamps in file_requests for x in timestamps],
+                        threads=max(1, cpu_count // probe_workers),
+                    ): file_requests
+                    for file, file_requests in requests.items()
+                }
+                for future in as_completed(probes):
+                    stats = future.result()
+                    for i, timestamps in probes[future]:
+                        results[i] = stats[: len(timestamps)]
+                        stats = stats[len(timestamps) :]
+            return results
+
+        # Take the candidate already in the store, or pick one by looking at
+        # tiny versions of the candidate frames before rendering anything
+        chosen: list[float | None] = []
+        to_probe: dict[Path, list[tuple[int, list[float]]]] = {}
+        for i, (file, candidates) in enumerate(slots):
+            chosen.append(
+                first_or_none(
+                    x for x in candidates if self.snapshot_path(file, x).exists()
+                )
+            )
+            if chosen[i] is None:
+                to_probe.setdefault(file, []).append((i, candidates[:1]))
+
         print()
-        if num_snapshots:
-            last_file = None
-            with Progress(
+        if to_probe:
+            with Status("[bold magenta]Checking snapshot candidates..."):
+                # Most preferred frames are fine, the stand-ins are only
+                # decoded for the slots whose preferred frame was rejected
+                preferred = probe(to_probe)
+                stand_ins: dict[Path, list[tuple[int, list[float]]]] = {}
+                for i, stats in preferred.items():
+                    file, candidates = slots[i]
+                    if (stats[0] and stats[0].usable) or len(candidates) == 1:
+                        chosen[i] = candidates[0]
+                    else:
+                        stand_ins.setdefault(file, []).append((i, candidates[1:]))
+                for i, stats in probe(stand_ins).items():
+                    chosen[i] = pick_candidate(slots[i][1], preferred[i] + stats)
+
+        jobs = [
+            (file, timestamp, self.snapshot_path(file, timestamp))
+            for (file, _), timestamp in zip(slots, chosen, strict=True)
+            if timestamp is not None
+        ]
+        snapshots = [snap for _, _, snap in jobs]
+        pending: dict[Path, list[tuple[float, Path]]] = {}
+        unique_jobs = dict.fromkeys(jobs)
+        for file, timestamp, snap in unique_jobs:
+            if not snap.exists():
+                pending.setdefault(file, []).append((timestamp, snap))
+
+        workers = max(1, min(workers, len(pending)))
+        # Split the cores between the ffmpeg processes running at once
+        threads = max(1, cpu_count // workers)
+        with (
+            Progress(
                 TextColumn("[progress.description]{task.description}[/]"),
                 BarColumn(),
                 MofNCompleteColumn(),
                 TaskProgressColumn(),
                 TimeRemainingColumn(elapsed_when_finished=True),
-            ) as progress:
-                for i in progress.track(
-                    range(num_snapshots),
-                    description=f"[bold green]Generating snapshots ({self.tracker.cli.aliases[0]})[/]",
-                ):
-                    mediainfo_obj = MediaInfo.parse(files[i])
-                    if not mediainfo_obj.video_tracks:
-                        eprint("File has no video tracks")
-                        return []
-                    if not mediainfo_obj.audio_tracks:
-                        eprint("File has no audio tracks")
-                        return []
-                    raw_duration = mediainfo_obj.video_tracks[0].duration
-                    if not raw_duration:
-                        eprint("Could not determine video duration")
-                        return []
-                    duration = float(raw_duration) / 1000
-                    interval = duration / (num_snapshots + 2)
-
-                    j = i
-                    if last_file != files[i]:
-                        j = 0
-                    last_file = files[i]
-
-                    snap: Path = self.cache_dir / "{num:02}{suffix}.png".format(
-                        num=i + 1,
-                        suffix=(
-                            ("_all" if self.tracker.all_files else "")
-                            + ("_rand" if self.tracker.random_snapshots else "")
-                        ),
-                    )
-
-                    if not snap.exists():
-                        subprocess.run(
-                            [
-                                "ffmpeg",
-                                "-y",
-                                "-v",
-                                "error",
-                                "-ss",
-                                str(
-                                    random.randint(
-                                        round(interval * 10),
-                                        round(interval * 10 * num_snapshots),
-                                    )
-                                    / 10
-                                    if self.tracker.random_snapshots
-                                    else str(interval * (j + 1))
-                                ),
-                                "-i",
-                                files[i],
-                                "-vf",
-                                "scale='max(sar,1)*iw':'max(1/sar,1)*ih'",
-                                "-frames:v",
-                                "1",
-                                snap,
-                            ],
-                            check=True,
-                        )
-                        with Image(filename=snap) as img:
-                            img.depth = 8
-                            img.save(filename=snap)
-                        oxipng.optimize(snap)
-                    snapshots.append(snap)
-
-        if not snapshots:
-            return []
-        # try to prevent black images
-        min_image = min(snapshots, key=lambda p: p.stat().st_size)
+            ) as progress,
+            ThreadPoolExecutor(max_workers=workers) as executor,
+        ):
+            task = progress.add_task(
+                f"[bold green]Generating snapshots ({self.tracker.cli.aliases[0]})[/]",
+                total=len(unique_jobs),
+                completed=len(unique_jobs) - sum(map(len, pending.values())),
+            )
+            extractions = [
+                executor.submit(
+                    extract_snapshots,
+                    file,
+                    file_jobs,
+                    threads=threads,
+                    callback=lambda _: progress.advance(task),
+                    thumbnail_width=self.tracker.thumbnail_width,
+                )
+                for file, file_jobs in pending.items()
+            ]
+            for extraction in as_completed(extractions):
+                extraction.result()
 
-        return [x for x in snapshots if x != min_image]
+        return snapshots
 
     def prepare(self, mediainfo: str | list[str] | None, snapshots: list[Path]) -> bool:
         if not self.tracker.prepare(
@@ -368,6 +580,7 @@ class PPTU:
             mediainfo=mediainfo,
             snapshots=snapshots,
             note=self.note,
+            index=self.index,
         ):
             eprint(f"Preparing upload to [cyan]{self.tracker.cli.name}[/] failed.")
             return False
@@ -397,3 +610,48 @@ class PPTU:
 
     def __str__(self) -> str:
         return f"{self.tracker.cli.aliases[0]} ({self.torrent_path})"
+
+
+def hash_torrents(pptus: list[PPTU]) -> None:
+    """Hash every distinct set of torrent files once, before the torrents are created."""
+    groups: dict[tuple[Any, ...], list[tuple[PPTU, Torrent]]] = {}
+    for pptu in pptus:
+        if pptu.config.get("default", "torrent_creator", "torf") not in ("torf", "pptu"):
+            continue
+        torrent = pptu.plan_torrent()
+        if pptu.piece_store.dirty_ranges(pptu.manifest, torrent.piece_size):
+            # Trackers with the same files and piece size share the hashing
+            key = (tuple(map(tuple, pptu.manifest)), torrent.piece_size)
+            groups.setdefault(key, []).append((pptu, torrent))
+
+    if not groups:
+        return
+
+    workers = pptus[0].config.get("default", "hash_workers") or os.cpu_count() or 1
+    workers = max(1, workers // len(groups))
+
+    print("\n[bold green]Hashing torrent files[/]")
+    with (
+        Progress(
+            TextColumn("[progress.description]{task.description}[/]"),
+            BarColumn(),
+            CustomTransferSpeedColumn(),
+            TaskProgressColumn(),
+            TimeRemainingColumn(elapsed_when_finished=True),
+        ) as progress,
+        ThreadPoolExecutor(max_workers=len(groups)) as executor,
+    ):
+        futures = {
+            executor.submit(
+                members[0][0].hash_torrent,
+                members[0][1],
+                progress,
+                workers=workers,
+                description=", ".join(x.tracker.cli.aliases[0] for x, _ in members),
+            ): members
+            for members in groups.values()
+        }
+        for future in as_completed(futures):
+            pieces = future.result()
+            for pptu, torrent in futures[future][1:]:
+                pptu.piece_store.save(pptu.manifest, torrent.piece_size, pieces)
@@ -1,15 +1,16 @@
 from __future__ import annotations
 
+import hashlib
 import re
 import time
 import uuid
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from functools import wraps
 from typing import TYPE_CHECKING, Any
 
 import cloup
 from guessit import guessit
-from pymediainfo import MediaInfo
 from pyotp import TOTP
 from rich.console import Console
 from rich.markup import escape
@@ -25,12 +26,21 @@ from rich.prompt import Confirm, Prompt
 
 from pptu import __version__
 from pptu.uploaders import Uploader
+from pptu.utils.cache import PersistentCache
 from pptu.utils.log import eprint, print, wprint
+from pptu.utils.mediainfo import parse_mediainfo
 from pptu.utils.xml import load_html
 
 if TYPE_CHECKING:
     from pathlib import Path
 
+    from pptu.utils.content import ContentIndex
+
+
+# Uploaded images that aren't attached to a torrent are temporary, their IDs are
+# only kept for retrying a failed upload and dropped once the upload succeeds
+IMAGE_ID_CACHE = PersistentCache("avistaz_image_ids", ttl=6 * 60 * 60)
+
 
 def common_options(f):
     @cloup.option(
@@ -73,6 +83,7 @@ class AvistaZNetwork(Uploader, ABC):
 
         self.year_in_series_name: bool = False
         self.keep_dubbed_dual_tags: bool = False
+        self.image_keys: list[str] = []
 
     @property
     def domain(self) -> str:
@@ -273,6 +284,7 @@ class AvistaZNetwork(Uploader, ABC):
         mediainfo: str | list[str] | None,
         snapshots: list[Path],
         note: str | None,
+        index: ContentIndex,
         *_: Any,
         **__: Any,
     ) -> bool:
@@ -396,36 +408,59 @@ class AvistaZNetwork(Uploader, ABC):
                 f"Trimmed {len(snapshots) - len(trimmed)} snapshot(s) to align to groups of 3"
             )
         snapshots = trimmed
-        with Progress(
-            TextColumn("[progress.description]{task.description}[/]"),
-            BarColumn(),
-            MofNCompleteColumn(),
-            TaskProgressColumn(),
-            TimeRemainingColumn(elapsed_when_finished=True),
-        ) as progress:
-            for img in progress.track(snapshots, description="Uploading snapshots"):
-                img_r = self.session.post(
-                    url=f"{self.base_url}/ajax/image/upload",
-                    data={
-                        "_token": token,
-                        "qquuid": str(uuid.uuid4()),
-                        "qqfilename": img.name,
-                        "qqtotalfilesize": img.stat().st_size,
-                    },
-                    files={
-                        "qqfile": (img.name, img.open("rb"), "image/png"),
-                    },
-                    headers={
-                        "x-requested-with": "XMLHttpRequest",
-                    },
-                    timeout=60,
-                )
-                img_r.raise_for_status()
-                res = img_r.json()
-                if res.get("error"):
-                    wprint(f"Failed to upload image: {res.get('error')}")
-                else:
-                    images.append(res["imageId"])
+
+        self.image_keys = []
+
+        def upload_image(img: Path) -> str | None:
+            key = f"{self.domain}:{hashlib.sha256(img.read_bytes()).hexdigest()}"
+            self.image_keys.append(key)
+            image_id: str | None = IMAGE_ID_CACHE.get(key)
+            if image_id:
+                return image_id
+
+            img_r = self.session.post(
+                url=f"{self.base_url}/ajax/image/upload",
+                data={
+                    "_token": token,
+                    "qquuid": str(uuid.uuid4()),
+                    "qqfilename": img.name,
+                    "qqtotalfilesize": img.stat().st_size,
+                },
+                files={
+                    "qqfile": (img.name, img.read_bytes(), "image/png"),
+                },
+                headers={
+                    "x-requested-with": "XMLHttpRequest",
+                },
+                timeout=60,
+            )
+            img_r.raise_for_status()
+            res = img_r.json()
+            if res.get("error"):
+                wprint(f"Failed to upload image: {res.get('error')}")
+                return None
+            image_id = res["imageId"]
+            IMAGE_ID_CACHE.set(key, image_id)
+            return image_id
+
+        with (
+            Progress(
+                TextColumn("[progress.description]{task.description}[/]"),
+                BarColumn(),
+                MofNCompleteColumn(),
+                TaskProgressColumn(),
+                TimeRemainingColumn(elapsed_when_finished=True),
+            ) as progress,
+            ThreadPoolExecutor(
+                max_workers=max(1, self.config.get(self, "image_upload_concurrency", 4))
+            ) as executor,
+        ):
+            task = progress.add_task("Uploading snapshots", total=len(snapshots))
+            futures = [executor.submit(upload_image, x) for x in snapshots]
+            for future in futures:
+                if image_id := future.result():
+                    images.append(image_id)
+                progress.advance(task)
 
         release_name = path.stem if path.is_file() else path.name
 
@@ -436,11 +471,8 @@ class AvistaZNetwork(Uploader, ABC):
                 gi.get("episode_title", "").replace(" ", "."), ""
             ).replace("..", ".")
 
-        if path.is_dir():
-            file = sorted([*path.glob("*.mkv"), *path.glob("*.mp4")])[0]
-        else:
-            file = path
-        mediainfo_obj = MediaInfo.parse(file)
+        file = index.videos()[0] if path.is_dir() else path
+        mediainfo_obj = parse_mediainfo(file)
 
         if mediainfo_obj.video_tracks[0].encoded_library_name == "x264":
             release_name = re.sub(r"(?i)h\.?264", "x264", release_name)
@@ -530,6 +562,10 @@ class AvistaZNetwork(Uploader, ABC):
             return False
         torrent_url = el.attrs["href"]
 
+        # The images belong to this torrent now, don't reuse them for another one
+        for key in self.image_keys:
+            IMAGE_ID_CACHE.delete(key)
+
         self.session.get(torrent_url, timeout=60)
 
         return True
@@ -16,6 +16,8 @@ from pptu.utils.log import eprint
 if TYPE_CHECKING:
     from pathlib import Path
 
+    from pptu.utils.content import ContentIndex
+
 
 class Uploader(ABC):
     source: str | None = None  # Source tag to use in created torrent files
@@ -109,6 +111,15 @@ class Uploader(ABC):
         """
         return None
 
+    @property
+    def thumbnail_width(self) -> int | None:
+        """Width of the thumbnails the tracker uses in its description."""
+        return None
+
+    def prefetch(self, paths: list[Path]) -> None:
+        """This method can look up what `prepare` needs for all of `paths` at once."""
+        _ = paths
+
     def login(self, *, args: Any = None) -> bool:
         _ = args
         if not self.session.cookies:
@@ -125,6 +136,7 @@ class Uploader(ABC):
         mediainfo: str | list[str] | None,
         snapshots: list[Path],
         note: str | None,
+        index: ContentIndex,
         *_: Any,
         **__: Any,
     ) -> bool:
@@ -5,22 +5,23 @@ from types import SimpleNamespace
 from typing import TYPE_CHECKING, Any
 
 import cloup
-import orjson
 from guessit import guessit
 from langcodes import Language
-from pymediainfo import MediaInfo
 from pyotp import TOTP
 from rich.prompt import Prompt
 
 from pptu.uploaders import Uploader
-from pptu.utils.image import ImgUploader, generate_thumbnails
+from pptu.utils.image import ImgUploader, generate_thumbnails, thumbnails_bbcode
 from pptu.utils.log import eprint, print, wprint
+from pptu.utils.mediainfo import parse_mediainfo
 from pptu.utils.regex import find
 from pptu.utils.xml import load_html
 
 if TYPE_CHECKING:
     from pathlib import Path
 
+    from pptu.utils.content import ContentIndex
+
 
 class BroadcasTheNet(Uploader):
     source = "BTN"
@@ -153,6 +154,11 @@ class BroadcasTheNet(Uploader):
     def exclude_regex(self) -> str:
         return r".*\.(ffindex|jpg|png|srt|nfo|torrent|txt)$"
 
+    @property
+    def thumbnail_width(self) -> int:
+        thumbnail_row_width = min(530, self.config.get(self, "snapshot_row_width", 530))
+        return int(thumbnail_row_width / self.config.get(self, "snapshot_columns", 2) - 5)
+
     @property
     def passkey(self) -> str | None:
         if res := self.session.get("https://backup.landof.tv/upload.php").text:
@@ -229,6 +235,7 @@ class BroadcasTheNet(Uploader):
         mediainfo: str | list[str] | None,
         snapshots: list[Path],
         note: str | None,
+        index: ContentIndex,
         *_: Any,
         **__: Any,
     ) -> bool:
@@ -308,19 +315,10 @@ class BroadcasTheNet(Uploader):
         else:
             print("AutoFill complete.")
 
-        if path.is_dir():
-            file = sorted([*path.glob("*.mkv"), *path.glob("*.mp4")])[0]
-        else:
-            file = path
-
-        info = (
-            orjson.loads(MediaInfo.parse(file, output="JSON", full=False))
-            .get("media", {})
-            .get("track", [])
-        )
+        file = index.videos()[0] if path.is_dir() else path
 
-        audio = next(x for x in info if x["@type"] == "Audio")
-        lang = audio.get("Language")
+        audio = next(iter(parse_mediainfo(file).audio_tracks))
+        lang = audio.language
         if not lang:
             eprint("Unable to determine audio language.")
             return False
@@ -351,28 +349,14 @@ class BroadcasTheNet(Uploader):
         snapshot_urls = uploader.upload(snapshots)
 
         if snapshot_urls:
-            thumbnail_row_width = min(
-                530, self.config.get(self, "snapshot_row_width", 530)
-            )
-            thumbnail_width = (
-                thumbnail_row_width / self.config.get(self, "snapshot_columns", 2)
-            ) - 5
-            thumbnail_urls = []
+            columns = self.config.get(self, "snapshot_columns", 2)
             thumbnails = generate_thumbnails(
-                snapshots, file_type="jpg", width=thumbnail_width
+                snapshots, file_type="jpg", width=self.thumbnail_width
             )
 
-            for thumb in uploader.upload(thumbnails):
-                thumbnail_urls.append(thumb)
-
-            for i in range(len(snapshots)):
-                snapshot = snapshot_urls[i] if i < len(snapshot_urls) else ""
-                thumb = thumbnail_urls[i] if i < len(thumbnail_urls) else ""
-                thumbnails_str += rf"[url={snapshot}][img]{thumb}[/img][/url]"
-                if (i + 1) % self.config.get(self, "snapshot_columns", 2) == 0:
-                    thumbnails_str += "\n"
-                else:
-                    thumbnails_str += " "
+            thumbnails_str = thumbnails_bbcode(
+                uploader, snapshot_urls, thumbnails, columns
+            )
 
         series_id = None
         if el := soup.select_one("[name=seriesid]"):
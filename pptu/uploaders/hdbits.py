@@ -21,6 +21,8 @@ from pptu.utils.xml import load_html
 if TYPE_CHECKING:
     from pathlib import Path
 
+    from pptu.utils.content import ContentIndex
+
 
 class HDBits(Uploader):
     source = "HDBits"
@@ -216,6 +218,7 @@ class HDBits(Uploader):
         mediainfo: str | list[str] | None,
         snapshots: list[Path],
         note: str | None,
+        index: ContentIndex,  # noqa: ARG002
         *_: Any,
         **__: Any,
     ) -> bool:
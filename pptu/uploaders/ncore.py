@@ -3,26 +3,29 @@ from __future__ import annotations
 import re
 from pathlib import Path
 from types import SimpleNamespace
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
 import cloup
 import niquests
 import orjson
 from guessit import guessit
 from langcodes import Language
-from pymediainfo import MediaInfo
 from pyotp import TOTP
 from rich.prompt import Prompt
 from rich.status import Status
 
 from pptu.uploaders import Uploader
 from pptu.utils.collections import first, first_or_else, first_or_none
-from pptu.utils.image import ImgUploader, generate_thumbnails
+from pptu.utils.image import ImgUploader, generate_thumbnails, thumbnails_bbcode
 from pptu.utils.imdb import imdb_search
 from pptu.utils.log import eprint, print, wprint
+from pptu.utils.mediainfo import parse_mediainfo
 from pptu.utils.regex import find
 from pptu.utils.xml import load_html
 
+if TYPE_CHECKING:
+    from pptu.utils.content import ContentIndex
+
 
 class nCore(Uploader):
     source = "ncore.pro"
@@ -75,6 +78,11 @@ class nCore(Uploader):
     def exclude_regex(self) -> str:
         return r".*\.(ffindex|jpg|png|torrent|txt)$"
 
+    @property
+    def thumbnail_width(self) -> int:
+        thumbnail_row_width = min(660, self.config.get(self, "snapshot_row_width", 660))
+        return int(thumbnail_row_width / self.config.get(self, "snapshot_row", 3))
+
     @property
     def passkey(self) -> str | None:
         if (res := self.session.get("https://ncore.pro/torrents.php").text) and (
@@ -156,6 +164,7 @@ class nCore(Uploader):
         mediainfo: str | list[str] | None,
         snapshots: list[Path],
         note: str | None,
+        index: ContentIndex,
         *_: Any,
         **__: Any,
     ) -> bool:
@@ -190,7 +199,7 @@ class nCore(Uploader):
         print(f"Detected: [bold cyan]{typ}[/]")
 
         if path.is_dir():
-            self.nfo_file = first_or_none(sorted([*path.glob("*.nfo")]))
+            self.nfo_file = first_or_none(index.find(".nfo"))
             if self.nfo_file:
                 urls = self._extract_nfo_urls(
                     Path(self.nfo_file).read_text(encoding="CP437", errors="ignore")
@@ -236,29 +245,21 @@ class nCore(Uploader):
             params={"action": "imdb_movie", "imdb_movie": imdb_id.lstrip("tT")},
         ).text
 
-        if path.is_dir():
-            file = sorted([*path.glob("*.mkv"), *path.glob("*.mp4")])[0]
-        else:
-            file = path
+        file = index.videos()[0] if path.is_dir() else path
 
         with Status("[bold magenta]Parsing for info scraping..."):
-            m_info_temp: str = MediaInfo.parse(file, output="JSON", full=True)
-            if m_info_temp:
-                mediainfo_: dict = orjson.loads(m_info_temp)["media"]["track"]
-            else:
-                eprint("MediaInfo parsing failed.", exit_code=1)
+            mediainfo_ = parse_mediainfo(file)
 
-        video = first_or_none(x for x in mediainfo_ if x["@type"] == "Video")
-        if size := (gi.get("screen_size") or video and video.get("Height")):
+        video = first_or_none(mediainfo_.video_tracks)
+        if size := (gi.get("screen_size") or video and video.height):
             type_ = ("xvid" if int(str(size).strip("ip")) < 720 else "hd") + type_
         else:
             print("Unable to determine video resolution.")
             return False
         print(f"Type: [bold cyan]{type_}[/]")
 
-        audios = (x for x in mediainfo_ if x["@type"] == "Audio")
-        for num, audio in enumerate(audios, 1):
-            lang = audio.get("Language")
+        for num, audio in enumerate(mediainfo_.audio_tracks, 1):
+            lang = audio.language
             if not lang:
                 eprint(f"Unable to determine {num} audio language.", exit_code=0)
                 continue
@@ -278,25 +279,14 @@ class nCore(Uploader):
             for snap in uploader.upload(snapshots[0:-3]):
                 snapshot_urls.append(snap)
 
-            thumbnail_row_width = min(
-                660, self.config.get(self, "snapshot_row_width", 660)
-            )
-            thumbnail_width = thumbnail_row_width / self.config.get(
-                self, "snapshot_row", 3
-            )
-            thumbnail_urls = []
+            columns = self.config.get(self, "snapshot_columns", 3)
             thumbnails = generate_thumbnails(
-                snapshots[0:-3], width=thumbnail_width, file_type="jpg"
+                snapshots[0:-3], width=self.thumbnail_width, file_type="jpg"
+            )
+
+            thumbnails_str += thumbnails_bbcode(
+                uploader, snapshot_urls, thumbnails, columns, separator=""
             )
-            for thumb in uploader.upload(thumbnails):
-                thumbnail_urls.append(thumb)
-
-            for i in range(len(snapshot_urls)):
-                snap = snapshot_urls[i]
-                thumb = thumbnail_urls[i]
-                thumbnails_str += f"[url={snap}][img]{thumb}[/img][/url]"
-                if (i + 1) % self.config.get(self, "snapshot_columns", 3) == 0:
-                    thumbnails_str += "\n"
             thumbnails_str += "\n[i] (Kattints a képekre a teljes felbontásban való megtekintéshez.)[/i][/center][/spoiler]"
 
         description = f"{thumbnails_str or ''}"
@@ -21,19 +21,22 @@ from pptu.uploaders import Uploader
 from pptu.utils import is_close_match
 from pptu.utils.anilist import (
     extract_name_from_filename,
-    process_anilist_info,
 )
+from pptu.utils.anime import prefetch_anime_info, resolve_anime_info
+from pptu.utils.animedb import open_anime_index
 from pptu.utils.click import comma_separated_param
 from pptu.utils.collections import first_or_else
 from pptu.utils.image import ImgUploader
 from pptu.utils.log import eprint, print, wprint
-from pptu.utils.mal import process_mal_info
+from pptu.utils.mediainfo import parse_mediainfo
 from pptu.utils.regex import find
 from pptu.utils.telegram import send_telegram_message
 
 if TYPE_CHECKING:
     from pathlib import Path
 
+    from pptu.utils.content import ContentIndex
+
 
 class nekoBT(Uploader):
     randomize_infohash = False
@@ -350,6 +353,14 @@ class nekoBT(Uploader):
 
         return None
 
+    def prefetch(self, paths: list[Path]) -> None:
+        if not self.no_plus_info:
+            prefetch_anime_info(
+                self.link,
+                [x.stem for x in paths],
+                open_anime_index(self.config.get(self, "anime_offline_database")),
+            )
+
     def prepare(
         self,
         path: Path,
@@ -357,6 +368,7 @@ class nekoBT(Uploader):
         mediainfo: str | list[str] | None,
         snapshots: list[Path],
         note: str | None,
+        index: ContentIndex,
         *_: Any,
         **__: Any,
     ) -> bool:
@@ -367,7 +379,7 @@ class nekoBT(Uploader):
         secondary_groups: list[dict[str, Any]] = []
 
         if path.is_dir():
-            files: list[Path] = sorted([*path.glob("*.mkv"), *path.glob("*.mp4")])
+            files: list[Path] = index.videos()
         else:
             files = [path]
 
@@ -464,7 +476,7 @@ class nekoBT(Uploader):
 
         try:
             with Status(f"[bold magenta]Parsing {files[0]}..."):
-                mediainfo_data: MediaInfo = MediaInfo.parse(files[0], full=True)
+                mediainfo_data: MediaInfo = parse_mediainfo(files[0])
                 if not mediainfo_data:
                     eprint("MediaInfo parsing failed.", exit_code=1, fatal=True)
         except KeyboardInterrupt:
@@ -520,14 +532,15 @@ class nekoBT(Uploader):
             self.movie = True
 
         if not self.no_plus_info:
-            if self.database in {"myanimelist", "mal"}:
-                plus_title, _ = process_mal_info(self.link, path.stem)
-                if not plus_title:
-                    plus_title, _ = process_anilist_info(self.link, path.stem)
-            else:  # anilist
-                plus_title, _ = process_anilist_info(self.link, path.stem)
-                if not plus_title:
-                    plus_title, _ = process_mal_info(self.link, path.stem)
+            plus_title, _ = resolve_anime_info(
+                self.link,
+                path.stem,
+                self.database,
+                require_title=True,
+                anime_index=open_anime_index(
+                    self.config.get(self, "anime_offline_database")
+                ),
+            )
 
             if plus_title:
                 name_plus.append(plus_title)
@@ -5,24 +5,25 @@ import sys
 import urllib.parse
 from pathlib import Path
 from types import SimpleNamespace
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
 import cloup
 import orjson
 from langcodes import Language
-from pymediainfo import MediaInfo
 
 from pptu.uploaders import Uploader
-from pptu.utils.anilist import (
-    process_anilist_info,
-)
+from pptu.utils.anime import prefetch_anime_info, resolve_anime_info
+from pptu.utils.animedb import open_anime_index
 from pptu.utils.image import ImgUploader
 from pptu.utils.log import eprint, print
-from pptu.utils.mal import process_mal_info
+from pptu.utils.mediainfo import parse_mediainfo
 from pptu.utils.regex import find
 from pptu.utils.rentry import rentry_upload
 from pptu.utils.telegram import send_telegram_message
 
+if TYPE_CHECKING:
+    from pptu.utils.content import ContentIndex
+
 # Constants
 SUB_CODEC_MAP = {"UTF-8": "SRT"}
 AUDIO_CODEC_MAP = {
@@ -291,6 +292,14 @@ class Nyaa(Uploader):
     def exclude_regex(self) -> str:
         return r".*\.(ffindex|jpg|png|srt|nfo|torrent|txt)$"
 
+    def prefetch(self, paths: list[Path]) -> None:
+        if not self.skip_database:
+            prefetch_anime_info(
+                self.link,
+                [x.name for x in paths],
+                open_anime_index(self.config.get(self, "anime_offline_database")),
+            )
+
     def prepare(
         self,
         path: Path,
@@ -298,11 +307,12 @@ class Nyaa(Uploader):
         mediainfo: str | list[str] | None,
         snapshots: list[Path],
         note: str | None,
+        index: ContentIndex,
         *_: Any,
         **__: Any,
     ) -> bool:
         if path.is_dir():
-            files = sorted([*path.glob("*.mkv"), *path.glob("*.mp4")])
+            files = index.videos()
             if not files:
                 eprint("No video files found in directory!")
                 return False
@@ -311,7 +321,7 @@ class Nyaa(Uploader):
             media_file = path
 
         try:
-            mediainfo_data = MediaInfo.parse(media_file, parse_speed=0.5, full=True)
+            mediainfo_data = parse_mediainfo(media_file)
             general_track = next(iter(mediainfo_data.general_tracks), None)
             duration = getattr(general_track, "duration", None)
             has_audio_bitrate = all(
@@ -319,7 +329,7 @@ class Nyaa(Uploader):
                 for t in mediainfo_data.audio_tracks
             )
             if not duration or not has_audio_bitrate:
-                mediainfo_data = MediaInfo.parse(media_file, parse_speed=1.0, full=True)
+                mediainfo_data = parse_mediainfo(media_file, parse_speed=1.0)
         except Exception as e:
             eprint(f"MediaInfo parsing failed: {e}")
             return False
@@ -345,16 +355,14 @@ class Nyaa(Uploader):
         name_plus: list[str] = []
         db_info_url = ""
         if not self.skip_database:
-            plus_title = None
-            if self.database in {"myanimelist", "mal"}:
-                plus_title, db_info_url = process_mal_info(self.link, path.name)
-                print(plus_title)
-                if not plus_title and not db_info_url:
-                    plus_title, db_info_url = process_anilist_info(self.link, path.name)
-            else:
-                plus_title, db_info_url = process_anilist_info(self.link, path.name)
-                if not plus_title and not db_info_url:
-                    plus_title, db_info_url = process_mal_info(self.link, path.name)
+            plus_title, db_info_url = resolve_anime_info(
+                self.link,
+                path.name,
+                self.database,
+                anime_index=open_anime_index(
+                    self.config.get(self, "anime_offline_database")
+                ),
+            )
 
             if plus_title:
                 name_plus.append(plus_title)
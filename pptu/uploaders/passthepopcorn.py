@@ -5,7 +5,6 @@ from types import SimpleNamespace
 from typing import TYPE_CHECKING, Any
 
 import cloup
-from pymediainfo import MediaInfo
 from pyotp import TOTP
 from rich.markup import escape
 from rich.prompt import Prompt
@@ -15,12 +14,15 @@ from pptu.utils.collections import first_or_else
 from pptu.utils.image import ImgUploader
 from pptu.utils.imdb import imdb_data, imdb_search
 from pptu.utils.log import eprint, print, wprint
+from pptu.utils.mediainfo import parse_mediainfo
 from pptu.utils.regex import find
 from pptu.utils.xml import load_html
 
 if TYPE_CHECKING:
     from pathlib import Path
 
+    from pptu.utils.content import ContentIndex
+
 
 class PassThePopcorn(Uploader):
     source: str = "PTP"
@@ -179,6 +181,7 @@ class PassThePopcorn(Uploader):
         mediainfo: str | list[str] | None,
         snapshots: list[Path],
         note: str | None,
+        index: ContentIndex,
         *_: Any,
         **__: Any,
     ) -> bool:
@@ -267,11 +270,8 @@ class PassThePopcorn(Uploader):
                 return False
             self.anti_csrf_token = el.attrs["value"]
 
-        if path.is_dir():
-            file = sorted([*path.glob("*.mkv"), *path.glob("*.mp4")])[0]
-        else:
-            file = path
-        mediainfo_obj = MediaInfo.parse(file)
+        file = index.videos()[0] if path.is_dir() else path
+        mediainfo_obj = parse_mediainfo(file)
         no_eng_subs = all(
             not (x.language or "").startswith("en") for x in mediainfo_obj.audio_tracks
         ) and all(
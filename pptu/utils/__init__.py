@@ -1,7 +1,7 @@
 from __future__ import annotations
 
+import multiprocessing
 from collections.abc import Mapping
-from difflib import SequenceMatcher
 from functools import lru_cache
 from typing import Any
 
@@ -13,16 +13,19 @@ def dict_to_json(data: Mapping[Any, Any]) -> str:
     return orjson.dumps(data).decode()
 
 
+def process_pool_context() -> multiprocessing.context.BaseContext:
+    """Start method for process pools, never fork as running threads can deadlock it."""
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
 def pluralize(count: int, singular: str, plural=None, include_count=True) -> str | Any:
     plural = plural or f"{singular}s"
     form = singular if count == 1 else plural
     return f"{count} {form}" if include_count else form
 
 
-def similar(x: str, y: str) -> float:
-    return SequenceMatcher(None, x, y).ratio()
-
-
 @lru_cache(maxsize=50)
 def is_close_match(language: str, languages: tuple[str]):
     if not (language and languages and all(languages)):
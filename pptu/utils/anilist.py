@@ -1,11 +1,18 @@
 import re
+from collections.abc import Iterable
 from typing import Any
 
 import niquests
 from guessit import guessit
 
-from pptu.utils import similar
-from pptu.utils.collections import first_or_else, first_or_none
+from pptu.utils.cache import (
+    METADATA_CACHE,
+    METADATA_NEGATIVE_CACHE,
+    cache_key,
+    cached,
+)
+from pptu.utils.collections import first, first_or_else, first_or_none
+from pptu.utils.fuzzy import TitleScorer
 from pptu.utils.log import wprint
 from pptu.utils.regex import find
 
@@ -53,92 +60,127 @@ def get_anilist_title(
     return ""
 
 
-def get_anilist_data(search_name: str = "", anilist_url: str = "") -> dict[str, Any]:
-    if anilist_url:
-        if mal_id := find(r"https://myanimelist.net/anime/(\d+)", anilist_url):
-            json_data = {
-                "query": """
-                    query ($idMal: Int) {
-                        Media(idMal: $idMal, type: ANIME) {
-                            idMal
-                            siteUrl
-                            title {
-                                romaji
-                                english
-                            }
-                            synonyms
-                        }
-                    }
-                """,
-                "variables": {"idMal": int(mal_id)},
-            }
+MEDIA_FIELDS = """
+    idMal
+    siteUrl
+    title {
+        romaji
+        english
+    }
+    synonyms
+"""
+
+
+def _query_anilist_batch(lookups: list[tuple[str, int | str]]) -> list[Any]:
+    """Run `lookups` in a single GraphQL request, each as an aliased field."""
+    # A lookup is ("id", AniList ID), ("idMal", MAL ID) or ("search", name)
+    variables: dict[str, int | str] = {}
+    fields = []
+    for i, (kind, value) in enumerate(lookups):
+        variables[f"v{i}"] = value
+        if kind == "search":
+            fields.append(
+                f"q{i}: Page(perPage: 10) {{"
+                f" media(search: $v{i}, type: ANIME) {{ {MEDIA_FIELDS} }} }}"
+            )
         else:
-            anilist_id = find(r"https://anilist.co/anime/(\d+)", anilist_url)
-            if not anilist_id:
-                return {}
-            json_data = {
-                "query": """
-                    query ($id: Int) {
-                        Media(id: $id, type: ANIME) {
-                            idMal
-                            siteUrl
-                            title {
-                                romaji
-                                english
-                            }
-                            synonyms
-                        }
-                    }
-                """,
-                "variables": {"id": int(anilist_id)},
-            }
-    else:
-        json_data = {
-            "query": """
-                query ($search: String) {
-                    Page(perPage: 10) {
-                        media(search: $search, type: ANIME) {
-                            idMal
-                            siteUrl
-                            title {
-                                romaji
-                                english
-                            }
-                            synonyms
-                        }
-                    }
-                }
-            """,
-            "variables": {"search": search_name},
-        }
+            fields.append(f"q{i}: Media({kind}: $v{i}, type: ANIME) {{ {MEDIA_FIELDS} }}")
+    params = ", ".join(
+        f"$v{i}: {'String' if kind == 'search' else 'Int'}"
+        for i, (kind, _) in enumerate(lookups)
+    )
 
     with niquests.Session(retries=5, disable_http3=True) as session:
         res = session.post(
             url="https://graphql.anilist.co",
             headers={"Content-Type": "application/json", "Accept": "application/json"},
-            json=json_data,
+            json={
+                "query": f"query ({params}) {{ {' '.join(fields)} }}",
+                "variables": variables,
+            },
         ).json()
 
-    if error := first_or_none(res.get("errors", [])):
-        wprint(f"Anilist error: {error.get('message')}")
+    # Only missing entries are definite answers, anything else fails the batch
+    if error := first_or_none(x for x in res.get("errors", []) if x.get("status") != 404):
+        raise ValueError(error.get("message"))
+
+    # The Media of each ID lookup ({} if it doesn't exist), the list of each search
+    data = res.get("data") or {}
+    return [
+        (data.get(f"q{i}") or {}).get("media") or []
+        if kind == "search"
+        else data.get(f"q{i}") or {}
+        for i, (kind, _) in enumerate(lookups)
+    ]
+
+
+@cached(METADATA_CACHE, METADATA_NEGATIVE_CACHE)
+def _query_anilist(kind: str, value: int | str) -> Any:
+    return first(_query_anilist_batch([(kind, value)]))
+
+
+def anilist_lookup(
+    anilist_url: str = "", search_name: str = ""
+) -> tuple[str, int | str] | None:
+    """Get the lookup of `_query_anilist_batch` for an AniList or MAL URL or a search name."""
+    if anilist_url:
+        if mal_id := find(r"https://myanimelist.net/anime/(\d+)", anilist_url):
+            return "idMal", int(mal_id)
+        if anilist_id := find(r"https://anilist.co/anime/(\d+)", anilist_url):
+            return "id", int(anilist_id)
+        return None
+    return "search", search_name
+
+
+def prefetch_anilist(lookups: Iterable[tuple[str, int | str]]) -> None:
+    """Run all of `lookups` that aren't cached yet in a single request and cache them."""
+    if METADATA_CACHE.ttl == 0:
+        return
+
+    missing = object()
+    if not (
+        pending := [
+            x
+            for x in dict.fromkeys(lookups)
+            if METADATA_CACHE.get(cache_key(_query_anilist, *x), missing) is missing
+        ]
+    ):
+        return
+
+    try:
+        results = _query_anilist_batch(pending)
+    except (ValueError, niquests.RequestException) as e:
+        wprint(f"Anilist error: {e}")
+        return
+
+    for lookup, result in zip(pending, results, strict=True):
+        (METADATA_CACHE if result else METADATA_NEGATIVE_CACHE).set(
+            cache_key(_query_anilist, *lookup), result
+        )
+
+
+def get_anilist_data(search_name: str = "", anilist_url: str = "") -> dict[str, Any]:
+    if not (lookup := anilist_lookup(anilist_url, search_name)):
+        return {}
+
+    try:
+        res = _query_anilist(*lookup)
+    except ValueError as e:
+        wprint(f"Anilist error: {e}")
         return {}
 
     if anilist_url:
-        return res.get("data", {}).get("Media") or {}
+        return res or {}
     else:
-        if data := res.get("data", {}).get("Page", {}).get("media", []):
+        if data := res:
+            scorer = TitleScorer(search_name or "")
             for result in data:
-                name_in = (search_name or "").casefold()
-                name_en = (result.get("title", {}).get("english") or "").casefold()
-                name_ori = (result.get("title", {}).get("romaji") or "").casefold()
-                name_synonyms = result.get("synonyms", [])
-
-                if (
-                    (similar(name_en, name_in) >= 0.75)
-                    or (similar(name_ori, name_in) >= 0.75)
-                    or any(
-                        x for x in name_synonyms if similar(x.casefold(), name_in) >= 0.75
-                    )
+                if scorer.any_match(
+                    [
+                        result.get("title", {}).get("english"),
+                        result.get("title", {}).get("romaji"),
+                        *result.get("synonyms", []),
+                    ]
                 ):
                     return result
 
@@ -156,35 +198,24 @@ def get_anilist_link(anilist_url: str = "", search_name: str = "") -> dict[str,
     return {}
 
 
-def process_anilist_info(link: str | None, name: str) -> tuple[str, str]:
-    """Process AniList info and return name additions and info URL."""
+def anilist_search_names(name: str) -> list[str]:
+    """Get the names to search AniList for `name` with, in order of preference."""
     base_search_name, is_movie = extract_name_from_filename(name)
     gi = guessit(name)
     season = str(gi.get("season", "")) if gi.get("season") else ""
 
-    search_name = base_search_name
     if not is_movie and season and season not in ["01", "1"]:
-        search_name = f"{base_search_name} season {season}"
-
-    anilist_data = get_anilist_link(link or "", search_name)
-
-    # Fallback to search without season if initial season search returned nothing
-    if not anilist_data and search_name != base_search_name:
-        anilist_data = get_anilist_link(link or "", base_search_name)
-        search_name = base_search_name
+        return [f"{base_search_name} season {season}", base_search_name]
+    return [base_search_name]
 
-    target_url = link or ""
-    if not target_url and anilist_data:
-        target_url = anilist_data.get("siteUrl") or ""
 
-    title = ""
-    if anilist_data:
-        t = get_anilist_title(search_name=search_name, anilist_data=anilist_data)
-        if t is not None:
-            title = t
-        else:
-            wprint("Failed to get AniList title")
-    else:
-        wprint("Failed to get AniList data")
+def anilist_info(link: str | None, search_name: str) -> tuple[str, str] | None:
+    """Get the name additions and info URL for one search, None if nothing was found."""
+    if not (anilist_data := get_anilist_link(link or "", search_name)):
+        return None
 
-    return title, target_url
+    target_url = link or anilist_data.get("siteUrl") or ""
+    title = get_anilist_title(search_name=search_name, anilist_data=anilist_data)
+    if title is None:
+        wprint("Failed to get AniList title")
+    return title or "", target_url
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import TYPE_CHECKING
+
+from pptu.utils.anilist import (
+    anilist_info,
+    anilist_lookup,
+    anilist_search_names,
+    get_anilist_title,
+    prefetch_anilist,
+)
+from pptu.utils.log import wprint
+from pptu.utils.mal import get_mal_title, process_mal_info
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+
+    from pptu.utils.animedb import AnimeIndex
+
+
+def _mal_info(link: str | None, name: str) -> tuple[str, str] | None:
+    title, url = process_mal_info(link, name)
+    return (title, url) if title or url else None
+
+
+def anilist_lookups(link: str | None, name: str) -> list[tuple[str, int | str]]:
+    """Get the AniList lookups that resolving `name` (or `link`) needs."""
+    if link:
+        return [x] if (x := anilist_lookup(anilist_url=link)) else []
+    return [("search", x) for x in anilist_search_names(name)]
+
+
+def local_anime_info(
+    anime_index: AnimeIndex, link: str | None, name: str, database: str = "anilist"
+) -> tuple[str, str] | None:
+    """Get the name additions and info URL of `name` from the offline index."""
+    for search_name in anilist_search_names(name)[: 1 if link else None]:
+        if not (
+            media := anime_index.get(link) if link else anime_index.search(search_name)
+        ):
+            continue
+
+        if media["idMal"] and (
+            database in {"myanimelist", "mal"} or not media["siteUrl"]
+        ):
+            mal_data = {
+                "title": media["title"]["romaji"],
+                "title_english": media["title"]["english"],
+                "title_synonyms": media["synonyms"],
+            }
+            title = get_mal_title(search_name=search_name, mal_data=mal_data)
+            url = f"https://myanimelist.net/anime/{media['idMal']}"
+        else:
+            title = get_anilist_title(search_name=search_name, anilist_data=media)
+            url = media["siteUrl"]
+        return title or "", link or url
+
+    return None
+
+
+def prefetch_anime_info(
+    link: str | None, names: Iterable[str], anime_index: AnimeIndex | None = None
+) -> None:
+    """Look up every AniList search or ID needed to resolve `names` in one request."""
+    # The names matched by the offline index don't need any request
+    if anime_index:
+        names = [x for x in names if not local_anime_info(anime_index, link, x)]
+    prefetch_anilist(
+        itertools.chain.from_iterable(anilist_lookups(link, x) for x in names)
+    )
+
+
+def resolve_anime_info(
+    link: str | None,
+    name: str,
+    database: str = "anilist",
+    *,
+    require_title: bool = False,
+    anime_index: AnimeIndex | None = None,
+) -> tuple[str, str]:
+    """Get the name additions and info URL of `name` from AniList and MyAnimeList."""
+    # A match in the offline index needs no request at all
+    if (
+        anime_index
+        and (info := local_anime_info(anime_index, link, name, database))
+        and (info[0] or not require_title)
+    ):
+        return info
+
+    # Every query starts at once, the preferred database first, then the other one.
+    # AniList searches with and without the season.
+    anilist: list[tuple[str, Callable[[], tuple[str, str] | None]]] = [
+        ("anilist", partial(anilist_info, link, x))
+        for x in anilist_search_names(name)[: 1 if link else None]
+    ]
+    mal: list[tuple[str, Callable[[], tuple[str, str] | None]]] = [
+        ("mal", partial(_mal_info, link, name))
+    ]
+    queries = mal + anilist if database in {"myanimelist", "mal"} else anilist + mal
+
+    # MAL only needs AniList to resolve the MAL ID of an AniList link
+    mal_needs_anilist = bool(link) and "myanimelist.net" not in (link or "").lower()
+
+    def after_batch(
+        query: Callable[[], tuple[str, str] | None],
+    ) -> tuple[str, str] | None:
+        batch.result()
+        return query()
+
+    executor = ThreadPoolExecutor(max_workers=len(queries) + 1)
+    try:
+        # The AniList lookups of every query are sent as one batched request first
+        batch = executor.submit(prefetch_anilist, anilist_lookups(link, name))
+        futures = [
+            (
+                source,
+                executor.submit(after_batch, query)
+                if source == "anilist" or mal_needs_anilist
+                else executor.submit(query),
+            )
+            for source, query in queries
+        ]
+        # The first result in query order wins and the others are abandoned. A
+        # database that found an entry without a usable title isn't asked again.
+        answered: set[str] = set()
+        for source, future in futures:
+            if source in answered:
+                continue
+            try:
+                info = future.result()
+            except Exception as e:
+                wprint(f"Failed to get {source} info: {e}")
+                continue
+            if info and (info[0] or (info[1] and not require_title)):
+                return info
+            if info:
+                answered.add(source)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    wprint("Failed to get anime info from AniList and MyAnimeList")
+    return "", link or ""
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import contextlib
+import re
+import sqlite3
+import uuid
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+import orjson
+from platformdirs import PlatformDirs
+from rich.console import Console
+
+from pptu import PROG_NAME
+from pptu.utils.fuzzy import MATCH_THRESHOLD, TitleScorer
+from pptu.utils.log import wprint
+from pptu.utils.regex import find
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+
+INDEX_PATH = (
+    PlatformDirs(appname=PROG_NAME, appauthor=False).user_cache_path / "anime_index.db"
+)
+# Entries sharing the most words with a search that are compared to it
+MAX_CANDIDATES = 50
+
+
+def _normalize(name: str) -> str:
+    return " ".join(re.findall(r"\w+", name.casefold()))
+
+
+def _tokens(name: str) -> set[str]:
+    return set(_normalize(name).split())
+
+
+def _first_id(pattern: str, urls: list[str]) -> int | None:
+    for url in urls:
+        if value := find(pattern, url):
+            return int(value)
+    return None
+
+
+class AnimeIndex:
+    """Local SQLite index of an anime-offline-database JSON dump."""
+
+    def __init__(self, path: Path = INDEX_PATH):
+        self.path = path
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        with contextlib.closing(sqlite3.connect(self.path)) as conn, conn:
+            yield conn
+
+    def is_current(self, dump: Path) -> bool:
+        if not self.path.exists():
+            return False
+        stat = dump.stat()
+        with self._connect() as conn, contextlib.suppress(sqlite3.Error):
+            row: tuple[int, int] | None = conn.execute(
+                "SELECT size, mtime_ns FROM source"
+            ).fetchone()
+            return row == (stat.st_size, stat.st_mtime_ns)
+        return False
+
+    def build(self, dump: Path) -> None:
+        """Replace the index with the entries of `dump`."""
+        data = orjson.loads(dump.read_bytes()).get("data", [])
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Build next to the index and swap it in, so readers never see a partial one
+        tmp_path = self.path.with_name(f"{self.path.name}.{uuid.uuid4().hex}.tmp")
+        with contextlib.closing(sqlite3.connect(tmp_path)) as conn, conn:
+            # Words of the titles and synonyms are indexed, so a search only
+            # compares the few entries sharing the most words with it
+            conn.executescript(
+                "CREATE TABLE source (size INTEGER, mtime_ns INTEGER);"
+                "CREATE TABLE entries ("
+                "id INTEGER PRIMARY KEY, anilist_id INTEGER, mal_id INTEGER, "
+                "title TEXT, synonyms BLOB);"
+                "CREATE TABLE tokens (token TEXT, entry INTEGER, "
+                "PRIMARY KEY (token, entry)) WITHOUT ROWID;"
+            )
+            for i, anime in enumerate(data):
+                sources = anime.get("sources", [])
+                anilist_id = _first_id(r"https://anilist.co/anime/(\d+)", sources)
+                mal_id = _first_id(r"https://myanimelist.net/anime/(\d+)", sources)
+                if not (anilist_id or mal_id):
+                    continue
+                synonyms = anime.get("synonyms", [])
+                conn.execute(
+                    "INSERT INTO entries VALUES (?, ?, ?, ?, ?)",
+                    (i, anilist_id, mal_id, anime.get("title"), orjson.dumps(synonyms)),
+                )
+                conn.executemany(
+                    "INSERT OR IGNORE INTO tokens VALUES (?, ?)",
+                    [
+                        (x, i)
+                        for x in set().union(
+                            *(_tokens(y) for y in [anime.get("title", ""), *synonyms])
+                        )
+                    ],
+                )
+            stat = dump.stat()
+            conn.execute(
+                "INSERT INTO source VALUES (?, ?)", (stat.st_size, stat.st_mtime_ns)
+            )
+            conn.execute("CREATE INDEX entries_anilist_id ON entries (anilist_id)")
+            conn.execute("CREATE INDEX entries_mal_id ON entries (mal_id)")
+        tmp_path.replace(self.path)
+
+    @staticmethod
+    def _media(row: tuple[int | None, int | None, str, bytes]) -> dict[str, Any]:
+        # Shaped like AniList's Media, the dump doesn't tell English titles apart
+        anilist_id, mal_id, title, synonyms = row
+        return {
+            "idMal": mal_id,
+            "siteUrl": f"https://anilist.co/anime/{anilist_id}" if anilist_id else None,
+            "title": {"romaji": title, "english": None},
+            "synonyms": orjson.loads(synonyms),
+        }
+
+    def get(self, url: str) -> dict[str, Any] | None:
+        """Get the entry of an AniList or MyAnimeList URL."""
+        if mal_id := find(r"https://myanimelist.net/anime/(\d+)", url):
+            column, value = "mal_id", int(mal_id)
+        elif anilist_id := find(r"https://anilist.co/anime/(\d+)", url):
+            column, value = "anilist_id", int(anilist_id)
+        else:
+            return None
+
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT anilist_id, mal_id, title, synonyms FROM entries "
+                f"WHERE {column} = ? ORDER BY id LIMIT 1",
+                (value,),
+            ).fetchone()
+        return self._media(row) if row else None
+
+    def search(self, name: str) -> dict[str, Any] | None:
+        """Get the entry whose title or a synonym is the most similar to `name`."""
+        if not (tokens := _tokens(name)):
+            return None
+
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT anilist_id, mal_id, title, synonyms FROM entries WHERE id IN ("
+                "SELECT entry FROM tokens "
+                f"WHERE token IN ({', '.join('?' * len(tokens))}) "
+                "GROUP BY entry ORDER BY COUNT(*) DESC, entry LIMIT ?) ORDER BY id",
+                (*sorted(tokens), MAX_CANDIDATES),
+            ).fetchall()
+
+        if not rows:
+            return None
+
+        # Ties go to the first entry of the dump, to keep matches deterministic
+        names = [(row, x) for row in rows for x in [row[2], *orjson.loads(row[3])]]
+        best = TitleScorer(_normalize(name)).best(
+            [_normalize(x) for _, x in names], MATCH_THRESHOLD
+        )
+        return self._media(names[best[0]][0]) if best else None
+
+
+@lru_cache
+def open_anime_index(dump: str | None) -> AnimeIndex | None:
+    """Open the index of the dump at `dump`, building it first if the dump changed."""
+    if not dump:
+        return None
+    if not (dump_path := Path(dump).expanduser()).is_file():
+        wprint(f"Anime offline database {dump_path} doesn't exist, ignoring it.")
+        return None
+
+    index = AnimeIndex()
+    if not index.is_current(dump_path):
+        with Console().status("Indexing anime offline database..."):
+            try:
+                index.build(dump_path)
+            except (OSError, orjson.JSONDecodeError, sqlite3.Error) as e:
+                wprint(f"Failed to index anime offline database: {e}")
+                return None
+    return index
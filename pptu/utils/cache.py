@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import contextlib
+import sqlite3
+import time
+from functools import wraps
+from typing import TYPE_CHECKING, Any, ParamSpec, TypeVar, cast
+
+import orjson
+from platformdirs import PlatformDirs
+from rich.markup import escape
+
+from pptu import PROG_NAME
+from pptu.utils.log import print
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+    from pathlib import Path
+
+
+P = ParamSpec("P")
+R = TypeVar("R")
+
+CACHE_PATH = PlatformDirs(appname=PROG_NAME, appauthor=False).user_cache_path / "cache.db"
+
+
+class PersistentCache:
+    """Key-value store in the user cache dir, entries expire after `ttl` seconds."""
+
+    def __init__(self, namespace: str, ttl: float | None = None, path: Path = CACHE_PATH):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.path = path
+
+    # A connection per operation, so an instance can be shared between threads
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with contextlib.closing(sqlite3.connect(self.path, timeout=30)) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "namespace TEXT, key TEXT, value BLOB, expires REAL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS entries_expires ON entries (expires)"
+            )
+            yield conn
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, expires FROM entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            ).fetchone()
+        if not row or (row[1] is not None and row[1] < time.time()):
+            return default
+        return orjson.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: float | None = None) -> None:
+        ttl = ttl if ttl is not None else self.ttl
+        now = time.time()
+        with self._connect() as conn:
+            # Purge expired entries of every namespace, nothing else ever deletes them
+            conn.execute(
+                "DELETE FROM entries WHERE expires IS NOT NULL AND expires < ?", (now,)
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                (
+                    self.namespace,
+                    key,
+                    orjson.dumps(value),
+                    now + ttl if ttl is not None else None,
+                ),
+            )
+
+    def delete(self, key: str) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            )
+
+
+# Strings in keys are compared case-insensitively and ignoring extra whitespace
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return " ".join(value.casefold().split())
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(x) for x in value]
+    return value
+
+
+def cache_key(func: Callable[..., Any], *args: Any, **kwargs: Any) -> str:
+    """Get the key that `cached` stores the result of calling `func` with the arguments under."""
+    call = orjson.dumps(
+        [
+            [_normalize(x) for x in args],
+            {k: _normalize(v) for k, v in sorted(kwargs.items()) if v},
+        ]
+    ).decode()
+    return f"{func.__module__}.{func.__qualname__}:{call}"
+
+
+def cached(
+    cache: PersistentCache, negative_cache: PersistentCache | None = None
+) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    """Remember the results of a function in `cache`, keyed by its name and arguments."""
+
+    def decorator(func: Callable[P, R]) -> Callable[P, R]:
+        @wraps(func)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            if cache.ttl == 0:
+                return func(*args, **kwargs)
+
+            key = cache_key(func, *args, **kwargs)
+            missing = object()
+            if (value := cache.get(key, missing)) is not missing:
+                call = key.partition(":")[2]
+                print(
+                    f"[dim]Using cached result of {func.__name__} for {escape(call)}[/]"
+                )
+                return cast("R", value)
+
+            # Empty results usually expire sooner, exceptions are never cached
+            value = func(*args, **kwargs)
+            (negative_cache if negative_cache and not value else cache).set(key, value)
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+# Lookups of IMDb, AniList and MyAnimeList, the TTLs are set from the config
+METADATA_CACHE = PersistentCache("metadata", ttl=7 * 24 * 60 * 60)
+METADATA_NEGATIVE_CACHE = PersistentCache("metadata", ttl=6 * 60 * 60)
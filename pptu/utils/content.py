@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import os
+import re
+from array import array
+from collections.abc import Iterable
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+VIDEO_SUFFIXES = (".mkv", ".mp4", ".m2ts")
+
+
+@lru_cache(maxsize=16)
+def _compile(regex: str) -> re.Pattern[str]:
+    return re.compile(regex)
+
+
+class ContentIndex:
+    """Files of an input collected with a single scandir pass."""
+
+    __slots__ = (
+        "_positions",
+        "inodes",
+        "is_dir",
+        "is_video",
+        "mtimes",
+        "path",
+        "paths",
+        "sizes",
+    )
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.is_dir = path.is_dir()
+        # Paths relative to the input sorted by name, the metadata in parallel arrays
+        self.paths: list[str] = []
+        self.sizes = array("Q")
+        self.mtimes = array("q")
+        self.inodes = array("Q")
+        self.is_video = bytearray()
+
+        if self.is_dir:
+            self._scan(path, "")
+        else:
+            self._add(path.name, path.stat())
+
+        self._positions = {x: i for i, x in enumerate(self.paths)}
+
+    def _add(self, rel_path: str, stat: os.stat_result) -> None:
+        self.paths.append(rel_path)
+        self.sizes.append(stat.st_size)
+        self.mtimes.append(stat.st_mtime_ns)
+        self.inodes.append(stat.st_ino)
+        self.is_video.append(rel_path.endswith(VIDEO_SUFFIXES))
+
+    def _scan(self, dirpath: Path | str, prefix: str) -> None:
+        with os.scandir(dirpath) as it:
+            entries = sorted(it, key=lambda x: x.name)
+        for entry in entries:
+            if entry.is_dir():
+                self._scan(entry.path, f"{prefix}{entry.name}/")
+            elif entry.is_file():
+                self._add(f"{prefix}{entry.name}", entry.stat())
+
+    def _included(self, exclude_regex: str | None) -> Iterable[int]:
+        if not exclude_regex:
+            return range(len(self.paths))
+        regex = _compile(exclude_regex)
+        return (i for i, x in enumerate(self.paths) if not regex.search(x))
+
+    def to_path(self, rel_path: str) -> Path:
+        return self.path / rel_path if self.is_dir else self.path
+
+    def total_size(self, exclude_regex: str | None = None) -> int:
+        return sum(self.sizes[i] for i in self._included(exclude_regex))
+
+    def videos(self, suffixes: tuple[str, ...] = (".mkv", ".mp4")) -> list[Path]:
+        """Top-level video files of the input sorted by name."""
+        return [
+            self.to_path(x)
+            for i, x in enumerate(self.paths)
+            if self.is_video[i] and "/" not in x and x.endswith(suffixes)
+        ]
+
+    def find(self, suffix: str) -> list[Path]:
+        """Top-level files with the given suffix sorted by name."""
+        return [
+            self.to_path(x) for x in self.paths if "/" not in x and x.endswith(suffix)
+        ]
+
+    def manifest(self, filepaths: Iterable[str | Path]) -> list[list[Any]]:
+        """Relative path, size, mtime and inode of the given files of the input."""
+        manifest = []
+        for filepath in map(Path, filepaths):
+            rel_path = self.paths[0]
+            if self.is_dir:
+                rel_path = filepath.relative_to(self.path).as_posix()
+            if (i := self._positions.get(rel_path)) is None:
+                # Created after the index was built
+                stat = filepath.stat()
+                row = [rel_path, stat.st_size, stat.st_mtime_ns, stat.st_ino]
+            else:
+                row = [rel_path, self.sizes[i], self.mtimes[i], self.inodes[i]]
+            if self.is_dir:
+                row[0] = f"{self.path.name}/{rel_path}"
+            manifest.append(row)
+        return manifest
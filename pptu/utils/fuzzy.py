@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from collections import Counter
+from difflib import SequenceMatcher
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+
+# Titles scoring at least this much against a search are considered the same
+MATCH_THRESHOLD = 0.75
+
+
+@lru_cache(maxsize=65536)
+def _profile(text: str) -> tuple[str, Counter[str]]:
+    normalized = text.casefold()
+    return normalized, Counter(normalized)
+
+
+class TitleScorer:
+    """Score candidate titles against one query like difflib, case-insensitively."""
+
+    def __init__(self, query: str):
+        self.query, self._counts = _profile(query)
+        self._matcher = SequenceMatcher(None, "", self.query)
+
+    def _length_bound(self, candidate: str) -> float:
+        if not (total := len(candidate) + len(self.query)):
+            return 1.0
+        return 2.0 * min(len(candidate), len(self.query)) / total
+
+    def _char_bound(self, candidate: str, counts: Counter[str]) -> float:
+        if not (total := len(candidate) + len(self.query)):
+            return 1.0
+        shared = sum(min(n, self._counts[x]) for x, n in counts.items())
+        return 2.0 * shared / total
+
+    def _score_above(self, candidate: str, threshold: float) -> float | None:
+        # Cheap upper bounds of the ratio first, the full comparison only runs for
+        # candidates that can still reach the threshold
+        normalized, counts = _profile(candidate)
+        if (
+            self._length_bound(normalized) < threshold
+            or self._char_bound(normalized, counts) < threshold
+        ):
+            return None
+        self._matcher.set_seq1(normalized)
+        return score if (score := self._matcher.ratio()) >= threshold else None
+
+    def score(self, candidate: str) -> float:
+        return self._score_above(candidate, 0.0) or 0.0
+
+    def matches(self, candidate: str, threshold: float = MATCH_THRESHOLD) -> bool:
+        return self._score_above(candidate, threshold) is not None
+
+    def any_match(
+        self, candidates: Sequence[str | None], threshold: float = MATCH_THRESHOLD
+    ) -> bool:
+        return any(self.matches(x, threshold) for x in candidates if x)
+
+    def best(
+        self, candidates: Sequence[str], threshold: float = 0.0
+    ) -> tuple[int, float] | None:
+        """Get the index and score of the first best of `candidates` above `threshold`."""
+        best: tuple[int, float] | None = None
+        for i, candidate in enumerate(candidates):
+            # Only candidates beating the best one so far need a full comparison
+            floor = max(threshold, best[1] + 1e-9) if best else threshold
+            if (score := self._score_above(candidate, floor)) is not None:
+                best = (i, score)
+        return best
@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import base64
+import bisect
+import contextlib
+import itertools
+import math
+import os
+from collections.abc import Callable, Iterator, Sequence
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha1
+from pathlib import Path
+from typing import Any
+
+import orjson
+
+from pptu.utils import process_pool_context
+
+# Amount of data each worker task hashes, large enough to keep the
+# per-task overhead negligible and small enough for smooth progress updates
+CHUNK_BYTES = 2**28
+
+
+def _spans(
+    filepaths: Sequence[str], sizes: Sequence[int], start: int, end: int
+) -> Iterator[tuple[str, int, int]]:
+    """Yield (path, offset, length) tuples covering the byte range [start, end)."""
+    pos = 0
+    for filepath, size in zip(filepaths, sizes, strict=True):
+        if pos + size > start and pos < end:
+            offset = max(start - pos, 0)
+            yield filepath, offset, min(size, end - pos) - offset
+        pos += size
+        if pos >= end:
+            break
+
+
+def _hash_range(
+    filepaths: Sequence[str],
+    sizes: Sequence[int],
+    piece_size: int,
+    first_piece: int,
+    last_piece: int,
+) -> bytes:
+    """Hash pieces [first_piece, last_piece) of the concatenated file stream."""
+    start = first_piece * piece_size
+    end = min(last_piece * piece_size, sum(sizes))
+
+    buf = bytearray(piece_size)
+    view = memoryview(buf)
+    hashes = bytearray()
+    filled = 0
+
+    for filepath, offset, length in _spans(filepaths, sizes, start, end):
+        with Path(filepath).open("rb", buffering=0) as fd:
+            fd.seek(offset)
+            remaining = length
+            while remaining:
+                n = fd.readinto(
+                    view[filled : filled + min(piece_size - filled, remaining)]
+                )
+                if not n:
+                    raise OSError(f"Unexpected end of file: {filepath}")
+                filled += n
+                remaining -= n
+                if filled == piece_size:
+                    hashes += sha1(view).digest()
+                    filled = 0
+
+    if filled:
+        hashes += sha1(view[:filled]).digest()
+
+    return bytes(hashes)
+
+
+def split_pieces(
+    first_piece: int, last_piece: int, piece_size: int
+) -> list[tuple[int, int]]:
+    """Split the piece range [first_piece, last_piece) into contiguous worker tasks."""
+    step = max(1, CHUNK_BYTES // piece_size)
+    return [(x, min(x + step, last_piece)) for x in range(first_piece, last_piece, step)]
+
+
+def hash_pieces(
+    filepaths: Sequence[str | Path],
+    piece_size: int,
+    *,
+    ranges: Sequence[tuple[int, int]] | None = None,
+    workers: int | None = None,
+    callback: Callable[[str, int, int], None] | None = None,
+) -> bytes:
+    """Hash the pieces of the concatenated `filepaths`, or only those in `ranges`."""
+    paths = [str(x) for x in filepaths]
+    sizes = [Path(x).stat().st_size for x in paths]
+    total_pieces = math.ceil(sum(sizes) / piece_size)
+    if ranges is None:
+        ranges = [(0, total_pieces)]
+
+    tasks = [task for x in ranges for task in split_pieces(*x, piece_size)]
+    pieces_total = sum(last - first for first, last in tasks)
+    pieces_done = 0
+
+    # Start offsets of the files, used to tell which file a task starts in
+    offsets = list(itertools.accumulate(sizes, initial=0))
+
+    def filepath_at(piece: int) -> str:
+        return paths[bisect.bisect_right(offsets, piece * piece_size) - 1]
+
+    result = bytearray()
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count(), mp_context=process_pool_context()
+    ) as executor:
+        futures = [
+            executor.submit(_hash_range, paths, sizes, piece_size, first, last)
+            for first, last in tasks
+        ]
+        # Digests are concatenated in range order, `callback` gets the current file
+        # and the hashed and total number of pieces
+        for (first, last), future in zip(tasks, futures, strict=True):
+            if callback:
+                callback(filepath_at(first), pieces_done, pieces_total)
+            result += future.result()
+            pieces_done += last - first
+
+        if callback and tasks:
+            callback(filepath_at(tasks[-1][0]), pieces_done, pieces_total)
+
+    return bytes(result)
+
+
+class PieceStore:
+    """Piece hashes of a torrent kept in the cache dir along with a file manifest."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.piece_size = 0
+        self.files: list[list[Any]] = []
+        self.pieces = b""
+
+        with contextlib.suppress(FileNotFoundError, orjson.JSONDecodeError, KeyError):
+            data = orjson.loads(self.path.read_bytes())
+            self.piece_size = data["piece_size"]
+            self.files = data["files"]
+            self.pieces = base64.b64decode(data["pieces"])
+
+    def dirty_ranges(
+        self, manifest: list[list[Any]], piece_size: int
+    ) -> list[tuple[int, int]]:
+        """Return the [first, last) piece ranges that have to be rehashed."""
+        total = sum(x[1] for x in manifest)
+        count = math.ceil(total / piece_size)
+        if piece_size != self.piece_size or not self.pieces:
+            return [(0, count)] if count else []
+
+        old_total = sum(x[1] for x in self.files)
+        old_count = len(self.pieces) // 20
+        old_offsets = {
+            tuple(file): offset
+            for file, offset in zip(
+                self.files,
+                itertools.accumulate((x[1] for x in self.files), initial=0),
+                strict=False,
+            )
+        }
+
+        dirty = bytearray(count)
+        dirty[old_count:] = b"\x01" * max(count - old_count, 0)
+        if total != old_total:
+            # The last piece of either layout has a different length now
+            for i in (old_count - 1, count - 1):
+                if 0 <= i < count:
+                    dirty[i] = 1
+
+        # Pieces of files that changed or moved to another offset can't be reused
+        offset = 0
+        for file in manifest:
+            if file[1] and old_offsets.get(tuple(file)) != offset:
+                first, last = offset // piece_size, (offset + file[1] - 1) // piece_size
+                dirty[first : last + 1] = b"\x01" * (last + 1 - first)
+            offset += file[1]
+
+        ranges: list[tuple[int, int]] = []
+        for i, value in enumerate(dirty):
+            if not value:
+                continue
+            if ranges and ranges[-1][1] == i:
+                ranges[-1] = (ranges[-1][0], i + 1)
+            else:
+                ranges.append((i, i + 1))
+        return ranges
+
+    def update(
+        self,
+        manifest: list[list[Any]],
+        piece_size: int,
+        ranges: Sequence[tuple[int, int]],
+        hashes: bytes,
+    ) -> bytes:
+        """Merge rehashed `ranges` into the stored pieces and return all pieces."""
+        count = math.ceil(sum(x[1] for x in manifest) / piece_size)
+        old = self.pieces if piece_size == self.piece_size else b""
+        pieces = bytearray(old[: count * 20].ljust(count * 20, b"\0"))
+
+        pos = 0
+        for first, last in ranges:
+            size = (last - first) * 20
+            pieces[first * 20 : last * 20] = hashes[pos : pos + size]
+            pos += size
+
+        self.save(manifest, piece_size, bytes(pieces))
+        return self.pieces
+
+    def save(self, manifest: list[list[Any]], piece_size: int, pieces: bytes) -> None:
+        self.piece_size = piece_size
+        self.files = manifest
+        self.pieces = pieces
+        self.path.write_bytes(
+            orjson.dumps(
+                {
+                    "piece_size": piece_size,
+                    "files": manifest,
+                    "pieces": base64.b64encode(pieces).decode(),
+                }
+            )
+        )
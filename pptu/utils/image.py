@@ -1,11 +1,14 @@
 from __future__ import annotations
 
 import contextlib
+import hashlib
 import re
-from functools import lru_cache
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
-from typing import TYPE_CHECKING, Any
+from typing import TYPE_CHECKING, Any, NamedTuple
 
+import humanize
 import niquests
 import oxipng
 from rich.console import Console
@@ -17,27 +20,108 @@ from rich.progress import (
     TextColumn,
     TimeRemainingColumn,
 )
+from wand.color import Color
 from wand.image import Image
 
+from pptu.utils.cache import PersistentCache
+from pptu.utils.collections import as_list, first_or_none
 from pptu.utils.log import eprint, print, wprint
+from pptu.utils.snapshots import thumbnail_path
 
 if TYPE_CHECKING:
+    from collections.abc import Callable
+
     from pptu.uploaders import Uploader
 
 
-@lru_cache(maxsize=128)
-def _cached_upload_keksh(
-    file_path: Path,
-    mtime: float,
-    api_key: str | None,
-    uploader_ref: ImgUploader,
-) -> str | None:
-    if mtime <= 0:
-        return None
+class ImagePolicy(NamedTuple):
+    max_bytes: int | None  # None if the host has no known size limit
+    formats: tuple[str, ...] = ("png", "jpg")
+
+
+HOST_POLICIES: dict[str, ImagePolicy] = {
+    "keksh": ImagePolicy(5 * 1024**2),  # without an API key
+    "ptpimg": ImagePolicy(None),
+    "hdbimg": ImagePolicy(None),
+}
+
+
+# Uploads running at once per host, overridable with `{uploader}_concurrency`
+HOST_CONCURRENCY: dict[str, int] = {
+    "keksh": 4,
+    "ptpimg": 4,
+}
+UPLOAD_ATTEMPTS = 3
+# Upper bound of a single HDBImg request, small enough to finish within its timeout
+HDBIMG_CHUNK_BYTES = 32 * 1024**2
+
+IMAGE_URL_CACHE = PersistentCache("image_urls", ttl=90 * 24 * 60 * 60)
+
+
+def _png_size(file: Path) -> tuple[int, int]:
+    """Read the dimensions from the IHDR chunk without decoding the image."""
+    with file.open("rb") as fd:
+        header = fd.read(24)
+    return int.from_bytes(header[16:20], "big"), int.from_bytes(header[20:24], "big")
+
+
+def _encode_png_max(src: Path, dst: Path) -> None:
+    oxipng.optimize(src, dst, level=6, strip=oxipng.StripChunks.safe())
+
 
+def _encode_png_palette(src: Path, dst: Path) -> None:
+    with Image(filename=src) as img:
+        img.quantize(256, dither=True)
+        img.save(filename=dst)
+    oxipng.optimize(dst)
+
+
+def _encode_jpg(quality: int) -> Callable[[Path, Path], None]:
+    def encode(src: Path, dst: Path) -> None:
+        with Image(filename=src) as img:
+            img.compression_quality = quality
+            img.save(filename=dst)
+
+    return encode
+
+
+def fit_image(file: Path, policy: ImagePolicy) -> Path:
+    """Get a version of the PNG `file` that fits the size limit of an image host."""
+    size = file.stat().st_size
+    if not policy.max_bytes or size <= policy.max_bytes or file.suffix != ".png":
+        return file
+
+    width, height = _png_size(file)
+    budget = policy.max_bytes
+    # From the best to the worst quality, only the options whose estimated size fits
+    # get encoded. The last value is the margin the estimate needs to leave, rough
+    # estimates need more.
+    options: list[tuple[str, str, float, float, Callable[[Path, Path], None]]] = [
+        # Maximum compression gains a few percent over the default level
+        ("max", "png", size * 0.95, 1.0, _encode_png_max),
+        # 8-bit palette instead of 24-bit RGB
+        ("palette", "png", size * 0.4, 0.9, _encode_png_palette),
+        # Roughly 1.6 and 0.8 bits per pixel for film content
+        ("q95", "jpg", width * height * 0.2, 0.9, _encode_jpg(95)),
+        ("q85", "jpg", width * height * 0.1, 0.9, _encode_jpg(85)),
+    ]
+    for name, file_type, estimate, margin, encode in options:
+        if file_type not in policy.formats or estimate > budget * margin:
+            continue
+        fitted = file.with_name(f"{file.stem}_{name}.{file_type}")
+        if not fitted.exists():
+            encode(file, fitted)
+        if fitted.stat().st_size <= budget:
+            return fitted
+
+    wprint(f"Unable to fit {file.name} in {humanize.naturalsize(budget, binary=True)}")
+    return file
+
+
+def _upload_keksh(file: Path, api_key: str | None, session: niquests.Session) -> str:
     headers = {"x-kek-auth": api_key} if api_key else {}
-    with file_path.open("rb") as fd:
-        r = uploader_ref.session.post(
+    with file.open("rb") as fd:
+        r = session.post(
             url="https://kek.sh/api/v1/posts",
             headers=headers,
             files={"file": fd},
@@ -47,18 +131,9 @@ def _cached_upload_keksh(
         return f"https://i.kek.sh/{r.json()['filename']}"
 
 
-@lru_cache(maxsize=128)
-def _cached_upload_ptpimg(
-    file_path: Path,
-    mtime: float,
-    api_key: str | None,
-    uploader_ref: ImgUploader,
-) -> str | None:
-    if mtime <= 0:
-        return None
-
-    with file_path.open("rb") as fd:
-        r = uploader_ref.session.post(
+def _upload_ptpimg(file: Path, api_key: str | None, session: niquests.Session) -> str:
+    with file.open("rb") as fd:
+        r = session.post(
             url="https://ptpimg.me/upload.php",
             files={"file-upload[]": fd},
             data={"api_key": api_key},
@@ -70,25 +145,24 @@ def _cached_upload_ptpimg(
         return f"https://ptpimg.me/{res_data[0]['code']}.{res_data[0]['ext']}"
 
 
+HOST_UPLOADERS: dict[str, Callable[[Path, str | None, niquests.Session], str]] = {
+    "keksh": _upload_keksh,
+    "ptpimg": _upload_ptpimg,
+}
+
+
 class ImgUploader:
     def __init__(self, tracker: Uploader):
         self.tracker = tracker
-        self.uploader = tracker.config.get(tracker, "img_uploader")
-        self.api_key = tracker.config.get("default", f"{self.uploader}_api_key", None)
+        # A list of hosts means the first one is used with the others as hedges
+        self.uploaders: list[str] = as_list(tracker.config.get(tracker, "img_uploader"))
+        self.uploader = first_or_none(self.uploaders)
         self.session = niquests.Session(retries=3, disable_http3=True)
 
-    def hdbimg(self, files: list[Path], thumbnail_width: int, name: str) -> list[Any]:
-        if self.tracker.cli.name != "HDBits":
-            eprint("HDBImg uploader can only be used for HDBits!")
-            return []
-
-        if not files:
-            return []
-
-        with (
-            Console().status("Uploading snapshots..."),
-            contextlib.ExitStack() as stack,
-        ):
+    def _hdbimg_chunk(
+        self, files: list[Path], thumbnail_width: int, name: str
+    ) -> list[str]:
+        with contextlib.ExitStack() as stack:
             r = self.tracker.session.post(
                 url="https://img.hdbits.org/upload_api.php",
                 files={
@@ -104,62 +178,164 @@ class ImgUploader:
                 },
                 timeout=60,
             )
-        if res := r.text:
-            if res.startswith("error"):
-                error = re.sub(r"^error: ", "", res)
-                eprint(f"Snapshot upload failed: [cyan]{error}[/cyan]")
-                return []
+        if (res := r.text or "").startswith("error"):
+            raise ValueError(re.sub(r"^error: ", "", res))
+        if len(urls := res.split()) != len(files):
+            raise ValueError(f"Expected {len(files)} images, got {len(urls)}")
+        return urls
 
-            return res.split()
-        return []
-
-    def keksh(self, files: list[Path]) -> list[Any]:
-        if not files:
+    def hdbimg(self, files: list[Path], thumbnail_width: int, name: str) -> list[Any]:
+        """Upload `files` to HDBImg in chunks, skipping the images uploaded before."""
+        if self.tracker.cli.name != "HDBits":
+            eprint("HDBImg uploader can only be used for HDBits!")
             return []
 
-        results = []
-        with Progress(
-            TextColumn("[progress.description]{task.description}[/]"),
-            BarColumn(),
-            MofNCompleteColumn(),
-            TaskProgressColumn(),
-            TimeRemainingColumn(elapsed_when_finished=True),
-        ) as progress:
-            for snap in progress.track(files, description="Uploading snapshots"):
-                try:
-                    url = _cached_upload_keksh(
-                        snap, snap.stat().st_mtime, self.api_key, self
-                    )
-                    if url:
-                        results.append(url)
-                except Exception as e:
-                    wprint(f"Failed to upload {snap.name} to kek.sh: {e}")
+        keys = [
+            f"hdbimg:{thumbnail_width}:{hashlib.sha256(x.read_bytes()).hexdigest()}"
+            for x in files
+        ]
+        results: list[str | None] = [IMAGE_URL_CACHE.get(x) for x in keys]
+
+        # Chunks are sent one after another, each one is a gallery of its own
+        chunks: list[list[int]] = []
+        chunk_bytes = 0
+        for i, file in enumerate(files):
+            if results[i]:
+                continue
+            size = file.stat().st_size
+            if not chunks or chunk_bytes + size > HDBIMG_CHUNK_BYTES:
+                chunks.append([])
+                chunk_bytes = 0
+            chunks[-1].append(i)
+            chunk_bytes += size
+
+        with Console().status("Uploading snapshots..."):
+            for chunk in chunks:
+                for attempt in range(UPLOAD_ATTEMPTS):
+                    try:
+                        urls = self._hdbimg_chunk(
+                            [files[i] for i in chunk], thumbnail_width, name
+                        )
+                    except Exception as e:
+                        if attempt == UPLOAD_ATTEMPTS - 1:
+                            eprint(f"Snapshot upload failed: [cyan]{e}[/cyan]")
+                            return []
+                        wprint(f"Snapshot upload failed, retrying: [cyan]{e}[/cyan]")
+                        time.sleep(2**attempt)
+                    else:
+                        break
+                # Remembered right away, so a rerun after a failure only sends the rest
+                for i, url in zip(chunk, urls, strict=True):
+                    IMAGE_URL_CACHE.set(keys[i], url)
+                    results[i] = url
 
         return results
 
-    def ptpimg(self, files: list[Path]) -> list[Any]:
-        if not files:
-            return []
+    def _upload_concurrently(
+        self,
+        files: list[Path],
+        upload_one: Callable[[Path], str | None],
+        host: str,
+    ) -> list[Any]:
+        """Upload `files` on a thread pool, retrying each failed upload on its own."""
 
-        results = []
-        with Progress(
-            TextColumn("[progress.description]{task.description}[/]"),
-            BarColumn(),
-            MofNCompleteColumn(),
-            TaskProgressColumn(),
-            TimeRemainingColumn(elapsed_when_finished=True),
-        ) as progress:
-            for snap in progress.track(files, description="Uploading snapshots"):
+        def upload(snap: Path) -> str | None:
+            for attempt in range(UPLOAD_ATTEMPTS):
                 try:
-                    url = _cached_upload_ptpimg(
-                        snap, snap.stat().st_mtime, self.api_key, self
-                    )
-                    if url:
-                        results.append(url)
+                    return upload_one(snap)
                 except Exception as e:
-                    wprint(f"Failed to upload {snap.name} to ptpimg: {e}")
+                    if attempt == UPLOAD_ATTEMPTS - 1:
+                        wprint(f"Failed to upload {snap.name} to {host}: {e}")
+                    else:
+                        time.sleep(2**attempt)
+            return None
 
-        return results
+        if not files:
+            return []
+
+        concurrency = self.tracker.config.get(
+            "default",
+            f"{self.uploader}_concurrency",
+            HOST_CONCURRENCY.get(self.uploader or "", 1),
+        )
+        with (
+            Progress(
+                TextColumn("[progress.description]{task.description}[/]"),
+                BarColumn(),
+                MofNCompleteColumn(),
+                TaskProgressColumn(),
+                TimeRemainingColumn(elapsed_when_finished=True),
+            ) as progress,
+            ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor,
+        ):
+            task = progress.add_task("Uploading snapshots", total=len(files))
+            futures = [executor.submit(upload, x) for x in files]
+            for future in futures:
+                future.add_done_callback(lambda _: progress.advance(task))
+            results = [x.result() for x in futures]
+
+        return [x for x in results if x]
+
+    def _cached_upload(self, file: Path, host: str) -> str:
+        """Upload `file` to `host` unless the same bytes were already uploaded there."""
+        file = fit_image(file, self.policy_for(host))
+        key = f"{host}:{hashlib.sha256(file.read_bytes()).hexdigest()}"
+        url: str | None = IMAGE_URL_CACHE.get(key)
+        if url:
+            # Optionally check with a HEAD request that the image is still there
+            if not self.tracker.config.get("default", "revalidate_image_urls", False):
+                return url
+            with contextlib.suppress(niquests.RequestException):
+                if self.session.head(url, timeout=10, allow_redirects=True).ok:
+                    return url
+            IMAGE_URL_CACHE.delete(key)
+
+        api_key = self.tracker.config.get("default", f"{host}_api_key", None)
+        url = HOST_UPLOADERS[host](file, api_key, self.session)
+        IMAGE_URL_CACHE.set(key, url)
+        return url
+
+    def _hedged_upload(self, file: Path) -> str:
+        """Upload `file` to the first host, hedged with the next ones, first URL wins."""
+        hosts = [x for x in self.uploaders if x in HOST_UPLOADERS]
+        hedge_after = self.tracker.config.get("default", "img_upload_hedge_after", 10)
+        errors: list[BaseException] = []
+
+        executor = ThreadPoolExecutor(max_workers=len(hosts))
+        try:
+            pending = {executor.submit(self._cached_upload, file, hosts.pop(0))}
+            while pending:
+                done, pending = wait(
+                    pending,
+                    timeout=hedge_after if hosts else None,
+                    return_when=FIRST_COMPLETED,
+                )
+                for future in done:
+                    if not (e := future.exception()):
+                        return future.result()
+                    errors.append(e)
+                # The next host joins when the uploads so far are slow or all failed
+                if hosts and (not done or not pending):
+                    pending.add(executor.submit(self._cached_upload, file, hosts.pop(0)))
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        raise errors[-1]
+
+    def keksh(self, files: list[Path]) -> list[Any]:
+        return self._upload_concurrently(
+            files, lambda x: self._cached_upload(x, "keksh"), "kek.sh"
+        )
+
+    def ptpimg(self, files: list[Path]) -> list[Any]:
+        return self._upload_concurrently(
+            files, lambda x: self._cached_upload(x, "ptpimg"), "ptpimg"
+        )
+
+    def policy_for(self, host: str) -> ImagePolicy:
+        if host == "keksh" and self.tracker.config.get("default", "keksh_api_key"):
+            return ImagePolicy(None)
+        return HOST_POLICIES.get(host, ImagePolicy(None))
 
     def upload(
         self,
@@ -167,11 +343,15 @@ class ImgUploader:
         thumbnail_width: int | None = None,
         name: str | None = None,
     ) -> list[Any]:
+        hosts = [x for x in self.uploaders if x in HOST_UPLOADERS]
+        if len(hosts) > 1 and self.uploader in HOST_UPLOADERS:
+            return self._upload_concurrently(files, self._hedged_upload, ", ".join(hosts))
         if self.uploader == "keksh":
             return self.keksh(files)
         elif self.uploader == "ptpimg":
             return self.ptpimg(files)
         elif self.uploader == "hdbimg":
+            files = [fit_image(x, self.policy_for("hdbimg")) for x in files]
             return self.hdbimg(files, thumbnail_width or 220, name or "")
         else:
             if not self.uploader:
@@ -202,7 +382,7 @@ def generate_thumbnails(
         TimeRemainingColumn(elapsed_when_finished=True),
     ) as progress:
         for snap in progress.track(snapshots, description="Generating thumbnails"):
-            thumb = snap.with_name(f"{snap.stem}_thumb_{width}.{file_type}")
+            thumb = thumbnail_path(snap, width, file_type)
             if not thumb.exists():
                 with Image(filename=snap) as img:
                     img.resize(width, round(img.height / (img.width / width)))
@@ -214,3 +394,68 @@ def generate_thumbnails(
             thumbnails.append(thumb)
 
     return thumbnails
+
+
+def generate_contact_sheet(
+    thumbnails: list[Path], columns: int, spacing: int = 5
+) -> Path:
+    """Tile `thumbnails` into a single JPG with `columns` thumbnails per row."""
+    key = hashlib.sha1(
+        f"{columns}:{spacing}:{':'.join(x.name for x in thumbnails)}".encode()
+    )
+    sheet = thumbnails[0].with_name(f"sheet_{key.hexdigest()}.jpg")
+    if sheet.exists():
+        return sheet
+
+    print("Generating contact sheet")
+    with contextlib.ExitStack() as stack:
+        images = [stack.enter_context(Image(filename=x)) for x in thumbnails]
+        rows = [images[i : i + columns] for i in range(0, len(images), columns)]
+        heights = [max(x.height for x in row) for row in rows]
+        canvas = stack.enter_context(
+            Image(
+                width=max(sum(x.width + spacing for x in row) - spacing for row in rows),
+                height=sum(heights) + spacing * (len(rows) - 1),
+                background=Color("black"),
+            )
+        )
+        top = 0
+        for row, height in zip(rows, heights, strict=True):
+            left = 0
+            for img in row:
+                canvas.composite(img, left=left, top=top)
+                left += img.width + spacing
+            top += height + spacing
+        canvas.depth = 8
+        canvas.save(filename=sheet)
+
+    return sheet
+
+
+def thumbnails_bbcode(
+    uploader: ImgUploader,
+    snapshot_urls: list[str],
+    thumbnails: list[Path],
+    columns: int,
+    separator: str = " ",
+) -> str:
+    """BBCode of `thumbnails` linking to `snapshot_urls`, as a contact sheet if enabled."""
+    tracker = uploader.tracker
+    if tracker.config.get(tracker, "contact_sheet", False) and (
+        sheet_url := first_or_none(
+            uploader.upload([generate_contact_sheet(thumbnails, columns)])
+        )
+    ):
+        # One image for all thumbnails, linking the snapshots by number
+        return f"[img]{sheet_url}[/img]\n" + " ".join(
+            f"[url={x}]{i}[/url]" for i, x in enumerate(snapshot_urls, 1)
+        )
+
+    thumbnail_urls = uploader.upload(thumbnails)
+    bbcode = ""
+    for i in range(len(thumbnails)):
+        snapshot = snapshot_urls[i] if i < len(snapshot_urls) else ""
+        thumb = thumbnail_urls[i] if i < len(thumbnail_urls) else ""
+        bbcode += f"[url={snapshot}][img]{thumb}[/img][/url]"
+        bbcode += "\n" if (i + 1) % columns == 0 else separator
+    return bbcode
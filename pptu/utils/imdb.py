@@ -5,6 +5,7 @@ from typing import Any
 import niquests
 
 from pptu.utils import dict_to_json
+from pptu.utils.cache import METADATA_CACHE, METADATA_NEGATIVE_CACHE, cached
 
 random = SystemRandom()
 
@@ -24,6 +25,7 @@ IMDB_HEAERS = {
 }
 
 
+@cached(METADATA_CACHE, METADATA_NEGATIVE_CACHE)
 def imdb_search(query: str) -> list[dict[str, Any]]:
     if not query:
         raise ValueError("query is required")
@@ -68,6 +70,7 @@ def imdb_search(query: str) -> list[dict[str, Any]]:
     ]
 
 
+@cached(METADATA_CACHE, METADATA_NEGATIVE_CACHE)
 def imdb_data(title_id: str) -> dict[str, Any]:
     if not title_id:
         raise ValueError("IMDb ID is required")
@@ -1,30 +1,58 @@
 import time
+from typing import Any
 
 from pymal.anime import Anime
 from pymal.searches.search_animes_provider import SearchAnimesProvider
 from rich import get_console
 
-from pptu.utils import similar
 from pptu.utils.anilist import extract_name_from_filename, get_anilist_data
-from pptu.utils.collections import first
+from pptu.utils.cache import METADATA_CACHE, METADATA_NEGATIVE_CACHE, cached
+from pptu.utils.collections import first_or_none
+from pptu.utils.fuzzy import TitleScorer
 from pptu.utils.log import eprint, wprint
 from pptu.utils.regex import find
 
 
+def _anime_data(anime: Anime) -> dict[str, Any]:
+    return {
+        "mal_id": anime.id,
+        "title": anime.title,
+        "title_english": anime.english,
+        "title_synonyms": anime.synonyms or [],
+        "url": f"https://myanimelist.net/anime/{anime.id}",
+    }
+
+
+@cached(METADATA_CACHE, METADATA_NEGATIVE_CACHE)
+def _fetch_mal_anime(mal_id: int) -> dict[str, Any]:
+    return _anime_data(Anime(mal_id))
+
+
+@cached(METADATA_CACHE, METADATA_NEGATIVE_CACHE)
+def _search_mal(search_name: str) -> dict[str, Any] | None:
+    provider = SearchAnimesProvider()
+    if not (results := provider.search(search_name)):
+        return None
+
+    results_list = list(results)
+    scorer = TitleScorer(search_name or "")
+    for anime in results_list[:10]:
+        synonyms = anime.synonyms or []
+        if scorer.any_match([anime.english, anime.title, first_or_none(synonyms)]):
+            return _anime_data(anime)
+
+    if best := scorer.best([x.title or "" for x in results_list]):
+        return _anime_data(results_list[best[0]])
+    return None
+
+
 def get_mal_data(search_name: str = "", mal_id: int | str | None = None) -> dict | None:
     console = get_console()
 
     if mal_id:
         try:
             with console.status("[bold magenta]Getting MAL info from input link..."):
-                anime = Anime(int(mal_id))
-                return {
-                    "mal_id": anime.id,
-                    "title": anime.title,
-                    "title_english": anime.english,
-                    "title_synonyms": anime.synonyms or [],
-                    "url": f"https://myanimelist.net/anime/{anime.id}",
-                }
+                return _fetch_mal_anime(int(mal_id))
         except Exception as e:
             wprint(f"Failed to fetch MAL data via pymal for ID {mal_id}: {e}")
             return None
@@ -32,46 +60,7 @@ def get_mal_data(search_name: str = "", mal_id: int | str | None = None) -> dict
     if search_name:
         try:
             with console.status("[bold magenta]Searching in MyAnimeList database..."):
-                provider = SearchAnimesProvider()
-                results = provider.search(search_name)
-            if results:
-                results_list = list(results)
-                for anime in results_list[:10]:
-                    name_in = (search_name or "").casefold()
-                    name_ori = (anime.title or "").casefold()
-                    name_en = (anime.english or "").casefold()
-                    synonyms = anime.synonyms or []
-                    name_syn = (synonyms[0] if synonyms else "").casefold()
-
-                    if (
-                        (similar(name_en, name_in) >= 0.75)
-                        or (similar(name_ori, name_in) >= 0.75)
-                        or (similar(name_syn, name_in) >= 0.75)
-                    ):
-                        return {
-                            "mal_id": anime.id,
-                            "title": anime.title,
-                            "title_english": anime.english,
-                            "title_synonyms": synonyms,
-                            "url": f"https://myanimelist.net/anime/{anime.id}",
-                        }
-
-                best = first(
-                    sorted(
-                        results_list,
-                        key=lambda x: similar(x.title or "", search_name),
-                        reverse=True,
-                    )
-                )
-
-                if best:
-                    return {
-                        "mal_id": best.id,
-                        "title": best.title,
-                        "title_english": best.english,
-                        "title_synonyms": best.synonyms or [],
-                        "url": f"https://myanimelist.net/anime/{best.id}",
-                    }
+                return _search_mal(search_name)
         except Exception as e:
             wprint(f"Failed pymal search for '{search_name}': {e}")
 
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import contextlib
+import os
+import uuid
+from collections.abc import Callable, Sequence
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Any
+
+import orjson
+from platformdirs import PlatformDirs
+from pymediainfo import MediaInfo
+
+from pptu import PROG_NAME
+from pptu.utils import process_pool_context
+
+if TYPE_CHECKING:
+    from pathlib import Path
+
+
+CACHE_DIR = PlatformDirs(appname=PROG_NAME, appauthor=False).user_cache_path / "mediainfo"
+# Stands in for the path of the file in cached text output, the cache key survives
+# renames so the path at parse time could be outdated (and private) by now
+PATH_PLACEHOLDER = "\x00path\x00"
+
+
+def _cache_path(file: Path) -> Path:
+    stat = file.stat()
+    return (
+        CACHE_DIR / f"{stat.st_dev}-{stat.st_ino}-{stat.st_size}-{stat.st_mtime_ns}.json"
+    )
+
+
+def _load(cache_path: Path) -> dict[str, Any]:
+    with contextlib.suppress(FileNotFoundError, orjson.JSONDecodeError):
+        entry: dict[str, Any] = orjson.loads(cache_path.read_bytes())
+        return entry
+    return {}
+
+
+def _save(cache_path: Path, entry: dict[str, Any]) -> None:
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file first so concurrent readers never see a partial file
+    tmp_path = cache_path.with_name(f"{cache_path.name}.{uuid.uuid4().hex}.tmp")
+    tmp_path.write_bytes(orjson.dumps(entry))
+    tmp_path.replace(cache_path)
+
+
+def parse_mediainfo(file: Path, parse_speed: float = 0.5) -> MediaInfo:
+    """Parse `file` into a MediaInfo object, using the on-disk cache when possible."""
+    cache_path = _cache_path(file)
+    entry = _load(cache_path)
+    # The complete XML output is kept, only a higher `parse_speed` parses again
+    if not entry.get("xml") or entry.get("parse_speed", 0) < parse_speed:
+        entry["xml"] = MediaInfo.parse(
+            file, output="OLDXML", full=True, parse_speed=parse_speed
+        )
+        entry["parse_speed"] = parse_speed
+        _save(cache_path, entry)
+
+    return MediaInfo(entry["xml"])
+
+
+def _fill_path(template: str, file: Path) -> str:
+    return template.replace(PATH_PLACEHOLDER, str(file))
+
+
+def mediainfo_text(file: Path) -> str:
+    """Get the text output of MediaInfo for `file`, using the on-disk cache when possible."""
+    cache_path = _cache_path(file)
+    entry = _load(cache_path)
+    if "text_template" not in entry:
+        text = MediaInfo.parse(file, output="", full=False)
+        entry["text_template"] = text.replace(str(file), PATH_PLACEHOLDER)
+        _save(cache_path, entry)
+
+    return _fill_path(entry["text_template"], file)
+
+
+def mediainfo_texts(
+    files: Sequence[Path],
+    *,
+    workers: int | None = None,
+    callback: Callable[[Path], None] | None = None,
+) -> list[str]:
+    """Get the text output of MediaInfo for each of `files`, parsing them concurrently."""
+    texts: dict[Path, str] = {}
+    for file in files:
+        if "text_template" in (entry := _load(_cache_path(file))):
+            texts[file] = _fill_path(entry["text_template"], file)
+            if callback:
+                callback(file)
+
+    if missing := [x for x in files if x not in texts]:
+        with ProcessPoolExecutor(
+            max_workers=min(workers or os.cpu_count() or 1, len(missing)),
+            mp_context=process_pool_context(),
+        ) as executor:
+            futures = {executor.submit(mediainfo_text, x): x for x in missing}
+            for future in as_completed(futures):
+                texts[futures[future]] = future.result()
+                if callback:
+                    callback(futures[future])
+
+    return [texts[x] for x in files]
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import contextlib
+import itertools
+import statistics
+import subprocess
+import tempfile
+from functools import partial
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+import oxipng
+
+from pptu.utils.log import wprint
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator, Sequence
+    from typing import IO
+
+
+SNAPSHOT_FILTER = "scale='max(sar,1)*iw':'max(1/sar,1)*ih'"
+SNAPSHOT_PIX_FMT = "rgb24"
+# Containers that seek reliably enough to take all snapshots in one ffmpeg pass
+MULTI_SEEK_SUFFIXES = (".mkv", ".mp4")
+
+# Candidate frames are judged on tiny grayscale versions of themselves
+PROBE_FILTER = "scale=64:36,format=gray"
+MIN_LUMA = 16  # black frames
+MAX_LUMA = 240  # white frames
+MIN_STDDEV = 6.0  # blank and flat frames
+MIN_SHARPNESS = 2.0  # blurry frames and cross-fades
+
+
+class FrameStats(NamedTuple):
+    mean: float
+    stddev: float
+    sharpness: float
+
+    @classmethod
+    def from_luma(cls, width: int, height: int, pixels: bytes) -> FrameStats:
+        # Sharpness is the mean absolute difference between neighbouring pixels
+        rows = [pixels[i * width : (i + 1) * width] for i in range(height)]
+        horizontal = [abs(a - b) for row in rows for a, b in itertools.pairwise(row)]
+        vertical = [abs(a - b) for a, b in zip(pixels, pixels[width:], strict=False)]
+        return cls(
+            mean=statistics.fmean(pixels),
+            stddev=statistics.pstdev(pixels),
+            sharpness=statistics.fmean(horizontal + vertical or [0]),
+        )
+
+    @property
+    def usable(self) -> bool:
+        return (
+            MIN_LUMA <= self.mean <= MAX_LUMA
+            and self.stddev >= MIN_STDDEV
+            and self.sharpness >= MIN_SHARPNESS
+        )
+
+    @property
+    def score(self) -> float:
+        return self.stddev * self.sharpness
+
+
+def read_pnm(stream: IO[bytes]) -> tuple[int, int, bytes] | None:
+    """Read the width, height and pixels of the next 8-bit PGM or PPM in `stream`."""
+    header: list[bytes] = []
+    token = b""
+    while len(header) < 4:
+        if not (byte := stream.read(1)):
+            if header or token:
+                raise ValueError("Truncated PNM image")
+            return None
+        if not byte.isspace():
+            token += byte
+        elif token:
+            header.append(token)
+            token = b""
+
+    magic, width, height, maxval = header
+    if magic not in (b"P5", b"P6") or maxval != b"255":
+        raise ValueError("Unsupported PNM image")
+    size = int(width) * int(height) * (3 if magic == b"P6" else 1)
+    if len(pixels := stream.read(size)) != size:
+        raise ValueError("Truncated PNM image")
+    return int(width), int(height), pixels
+
+
+def decode_frames(
+    file: Path,
+    timestamps: Sequence[float],
+    *,
+    vfilter: str = SNAPSHOT_FILTER,
+    pix_fmt: str = SNAPSHOT_PIX_FMT,
+    threads: int = 0,
+    thumbnail_width: int | None = None,
+    thumbnail_pattern: str | None = None,
+) -> Iterator[tuple[int, int, bytes]]:
+    """Decode the frames of `file` at `timestamps` in seconds with one ffmpeg process."""
+    # Every timestamp is a separately seeked input of the same file, the
+    # first frame of each is cut out and concatenated into a single stream
+    # of PNM images on stdout
+    args: list[str | Path] = ["ffmpeg", "-v", "error"]
+    for timestamp in timestamps:
+        args += ["-threads", str(threads), "-ss", str(timestamp), "-i", file]
+    graph = "".join(
+        f"[{i}:v:0]trim=end_frame=1,setpts=PTS-STARTPTS,{vfilter}[v{i}];"
+        for i in range(len(timestamps))
+    )
+    graph += "".join(f"[v{i}]" for i in range(len(timestamps)))
+    graph += f"concat=n={len(timestamps)}:v=1:a=0"
+    # The same frames are also scaled to JPG thumbnails, numbered from 0
+    if thumbnail_width and thumbnail_pattern:
+        graph += f",split[out][full];[full]scale={thumbnail_width}:-2[thumbs]"
+    else:
+        graph += "[out]"
+    args += ["-filter_complex", graph, "-map", "[out]", "-pix_fmt", pix_fmt]
+    args += ["-c:v", "ppm" if pix_fmt == "rgb24" else "pgm", "-f", "image2pipe", "-"]
+    if thumbnail_width and thumbnail_pattern:
+        args += ["-map", "[thumbs]", "-pix_fmt", "yuvj420p", "-c:v", "mjpeg", "-q:v", "2"]
+        args += ["-start_number", "0", "-f", "image2", thumbnail_pattern]
+
+    with subprocess.Popen(args, stdout=subprocess.PIPE) as proc:
+        assert proc.stdout
+        while frame := read_pnm(proc.stdout):
+            yield frame
+
+    if proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, args)
+
+
+def write_snapshot(snap: Path, width: int, height: int, pixels: bytes) -> None:
+    """Encode rgb24 `pixels` to an optimized PNG in memory and write it once."""
+    png = oxipng.RawImage(
+        pixels, width, height, color_type=oxipng.ColorType.rgb()
+    ).create_optimized_png()
+
+    # Only ever expose complete snapshots, existing ones are treated as cached
+    tmp_path = snap.with_name(f"{snap.name}.tmp")
+    tmp_path.write_bytes(png)
+    tmp_path.replace(snap)
+
+
+def thumbnail_path(snap: Path, width: int, file_type: str = "jpg") -> Path:
+    return snap.with_name(f"{snap.stem}_thumb_{width}.{file_type}")
+
+
+def _extract_frames(
+    file: Path,
+    jobs: Sequence[tuple[float, Path]],
+    threads: int,
+    callback: Callable[[Path], None],
+    thumbnail_width: int | None,
+) -> None:
+    with tempfile.TemporaryDirectory(dir=jobs[0][1].parent) as tmp_dir:
+        frames = decode_frames(
+            file,
+            [x for x, _ in jobs],
+            threads=threads,
+            thumbnail_width=thumbnail_width,
+            thumbnail_pattern=str(Path(tmp_dir, "%d.jpg")),
+        )
+        for i, frame in enumerate(frames):
+            if i < len(jobs):
+                write_snapshot(jobs[i][1], *frame)
+                callback(jobs[i][1])
+
+        if thumbnail_width:
+            for i, (_, snap) in enumerate(jobs):
+                with contextlib.suppress(FileNotFoundError):
+                    Path(tmp_dir, f"{i}.jpg").replace(
+                        thumbnail_path(snap, thumbnail_width)
+                    )
+
+    if not all(snap.exists() for _, snap in jobs) or (
+        thumbnail_width
+        and not all(thumbnail_path(x, thumbnail_width).exists() for _, x in jobs)
+    ):
+        raise ValueError(f"ffmpeg returned fewer frames than requested for {file}")
+
+
+def extract_snapshots(
+    file: Path,
+    jobs: Sequence[tuple[float, Path]],
+    *,
+    threads: int = 0,
+    callback: Callable[[Path], None] | None = None,
+    thumbnail_width: int | None = None,
+) -> None:
+    """Extract the frames of `file` at the given timestamps (in seconds) to PNGs."""
+    reported: set[Path] = set()
+
+    def report(snap: Path) -> None:
+        if callback and snap not in reported:
+            callback(snap)
+        reported.add(snap)
+
+    # One ffmpeg process for all frames if the container seeks reliably
+    if len(jobs) > 1 and file.suffix in MULTI_SEEK_SUFFIXES:
+        try:
+            _extract_frames(file, jobs, threads, report, thumbnail_width)
+        except (subprocess.CalledProcessError, ValueError):
+            wprint(f"Extracting all snapshots of {file.name} at once failed, retrying.")
+            # The frames can't be trusted to belong to their timestamps
+            for _, snap in jobs:
+                snap.unlink(missing_ok=True)
+                if thumbnail_width:
+                    thumbnail_path(snap, thumbnail_width).unlink(missing_ok=True)
+        else:
+            return
+
+    for job in jobs:
+        _extract_frames(file, [job], threads, report, thumbnail_width)
+
+
+def probe_frames(
+    file: Path, timestamps: Sequence[float], *, threads: int = 0
+) -> list[FrameStats | None]:
+    """Get the statistics of the frames of `file` at `timestamps`, None if undecodable."""
+    # Tiny grayscale frames are cheap next to rendering a snapshot
+    decode = partial(decode_frames, vfilter=PROBE_FILTER, pix_fmt="gray", threads=threads)
+    if len(timestamps) > 1 and file.suffix in MULTI_SEEK_SUFFIXES:
+        with contextlib.suppress(subprocess.CalledProcessError, ValueError):
+            stats: list[FrameStats | None] = [
+                FrameStats.from_luma(*x) for x in decode(file, timestamps)
+            ]
+            if len(stats) == len(timestamps):
+                return stats
+
+    result: list[FrameStats | None] = []
+    for timestamp in timestamps:
+        try:
+            frame = next(decode(file, [timestamp]), None)
+        except (subprocess.CalledProcessError, ValueError):
+            frame = None
+        result.append(frame and FrameStats.from_luma(*frame))
+    return result
+
+
+def pick_candidate(
+    candidates: Sequence[float], stats: Sequence[FrameStats | None]
+) -> float:
+    """Pick the first usable candidate, or the most detailed one if none is usable."""
+    for timestamp, stat in zip(candidates, stats, strict=True):
+        if stat and stat.usable:
+            return timestamp
+    return max(
+        zip(candidates, stats, strict=True),
+        key=lambda x: x[1].score if x[1] else -1,
+    )[0]